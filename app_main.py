@@ -1,15 +1,63 @@
 #app_main.py — це головний керівник, який: Ініціалізує адмін-обліковий запис;Підключає маршрути для публічних і адмін-функцій;Роздає статичні файли й HTML-шаблони;Забезпечує запуск FastAPI.
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+import asyncio
+import logging
 import os
 
 from controllers.feedback_controller import router as feedback_router
 from controllers.admin_controller import router as admin_router
 
-from services.db_service import add_admin_user, verify_admin_user, set_secret_view_password, generate_random_password
+from services.async_db_service import dispose_async_engine
+from services.batching_service import all_batcher_stats
+from services.cache_service import all_cache_stats
+from services.group_commit_service import feedback_writer
+from services.metrics_service import (
+    METRICS_ENABLED, CONTENT_TYPE, MetricsMiddleware, register_collector, render_metrics,
+)
+from services.db_service import init_db, add_admin_user, verify_admin_user, set_secret_view_password, generate_random_password
+from services.executor_service import (
+    run_inference, shutdown_inference_executor, INFERENCE_EXECUTOR, INFERENCE_WORKERS,
+)
+from services.classification_service import classification_worker, warm_up_models
+from services.upload_service import cleanup_stale_uploads
+from services.institution_service import institution_registry
+
+logger = logging.getLogger(__name__)
+
+async def load_models(app: FastAPI):
+    # Моделі вантажаться у фоні: адмінка і сторінка введення коду доступні одразу,
+    # а /ready відповідає 200 лише після warm-up
+    try:
+        # У режимі process кожен воркер пулу має прогріти власну копію моделей
+        jobs = INFERENCE_WORKERS if INFERENCE_EXECUTOR == "process" else 1
+        await asyncio.gather(*(run_inference(warm_up_models) for _ in range(jobs)))
+        app.state.models_status = "ready"
+    except Exception:
+        logger.exception("Не вдалося завантажити моделі")
+        app.state.models_status = "error"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    await asyncio.to_thread(initialize_admin)
+    await asyncio.to_thread(institution_registry.load)
+    await asyncio.to_thread(cleanup_stale_uploads)
+    app.state.models_status = "loading"
+    warmup_task = asyncio.create_task(load_models(app))
+    classification_worker.start()
+    yield
+    warmup_task.cancel()
+    await classification_worker.stop()
+    shutdown_inference_executor()
+    await dispose_async_engine()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 # Ensure uploads directory exists before mounting static files
 os.makedirs("uploads", exist_ok=True)
@@ -47,12 +95,46 @@ def initialize_admin():
         f.write(f"Secret view password: {secret_view_password}\n")
         f.write("Please delete this file after first login and/or change password in web interface!\n")
 
-initialize_admin()
-
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/ready")
+async def readiness_check():
+    status = getattr(app.state, "models_status", "loading")
+    if status == "ready":
+        return {"status": "ready"}
+    return JSONResponse({"status": status}, status_code=503)
+
+@register_collector
+def runtime_metrics():
+    # Показники, які вже рахують батчери, кеші й груповий писач (ті самі, що в /admin/inference_stats)
+    batchers = all_batcher_stats()
+    caches = all_cache_stats()
+    writer = feedback_writer.stats()
+    by_batcher = lambda key: [({"batcher": b["name"]}, b[key]) for b in batchers]
+    by_cache = lambda key: [({"cache": c["name"]}, c[key]) for c in caches]
+    return [
+        ("inference_queue_depth", "gauge", "Тексти, що чекають на батч моделі", by_batcher("queue_depth")),
+        ("inference_batches_total", "counter", "Виконані батчі моделі", by_batcher("batches")),
+        ("inference_batch_items_total", "counter", "Тексти у виконаних батчах", by_batcher("items")),
+        ("inference_queue_overflows_total", "counter", "Виклики, що чекали на місце в повній черзі батчера", by_batcher("overflows")),
+        ("inference_queue_rejected_total", "counter", "Виклики, відхилені через переповнену чергу батчера", by_batcher("rejected")),
+        ("inference_avg_batch_size", "gauge", "Середній розмір батчу моделі", by_batcher("avg_batch_size")),
+        ("inference_cache_size", "gauge", "Записи в кеші інференсу", by_cache("size")),
+        ("inference_cache_hits_total", "counter", "Влучання в кеш інференсу (пам'ять і диск)",
+         [({"cache": c["name"]}, c["hits"] + c["disk_hits"]) for c in caches]),
+        ("inference_cache_misses_total", "counter", "Промахи кешу інференсу", by_cache("misses")),
+        ("group_commit_queue_depth", "gauge", "Записи, що чекають на груповий коміт", [({}, writer["queue_depth"])]),
+        ("group_commit_batches_total", "counter", "Виконані групові коміти", [({}, writer["batches"])]),
+        ("group_commit_items_total", "counter", "Записи в групових комітах", [({}, writer["items"])]),
+    ]
+
+if METRICS_ENABLED:
+    @app.get("/metrics")
+    async def metrics():
+        return Response(render_metrics(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app_main:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,63 @@
+# benchmarks/bench_admin_auth.py
+# Латентність запитів адмінки з HTTP Basic: кожен запит перевіряє пароль через bcrypt
+# (AUTH_CACHE_TTL_SECONDS=0) проти кешу перевірених облікових даних.
+# Працює на тимчасовій SQLite-базі, якщо DATABASE_URL не задано.
+#
+#   python -m benchmarks.bench_admin_auth --requests 200
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+def measure(client, path, auth, requests):
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.get(path, auth=auth)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": statistics.quantiles(latencies, n=20)[-1] * 1000,
+        "rps": requests / sum(latencies),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--path", default="/admin/institutions_options")
+    args = parser.parse_args()
+
+    if "DATABASE_URL" not in os.environ:
+        tmp = tempfile.mkdtemp()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+
+    from fastapi.testclient import TestClient
+
+    from app_main import app
+    from services import auth_service
+    from services.db_service import init_db, add_admin_user, add_institution
+
+    init_db()
+    add_admin_user("bench", "bench-password")
+    add_institution("Бенчмарк")
+    auth = ("bench", "bench-password")
+    client = TestClient(app)
+
+    ttl = auth_service.AUTH_CACHE_TTL_SECONDS
+    results = {}
+    for label, cache_ttl in (("bcrypt on every request", 0), (f"credential cache (ttl={ttl or 300:g}s)", ttl or 300)):
+        auth_service.AUTH_CACHE_TTL_SECONDS = cache_ttl
+        auth_service.invalidate_credentials_cache()
+        client.get(args.path, auth=auth)  # прогрів
+        results[label] = measure(client, args.path, auth, args.requests)
+
+    print(f"{args.requests} x GET {args.path}")
+    print(f"{'mode':<32} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8}")
+    for label, r in results.items():
+        print(f"{label:<32} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['rps']:8.1f}")
+
+if __name__ == "__main__":
+    main()
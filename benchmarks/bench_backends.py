@@ -0,0 +1,78 @@
+# benchmarks/bench_backends.py
+# Порівняння бекендів (torch / quantized / onnx) на фіксованому корпусі:
+# збіг міток і максимальне відхилення скорів відносно eager PyTorch, латентність і пропускна здатність.
+#
+#   python -m benchmarks.bench_backends --model all --backends torch,quantized,onnx
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.corpus import BENCH_CORPUS
+from services.model_backend import SequenceClassifier, BACKENDS
+from services.nlp_service import model_name as SENTIMENT_MODEL
+from services.spam_service import MODEL_PATH as SPAM_MODEL_PATH
+
+MODELS = {
+    "sentiment": (SENTIMENT_MODEL, {"tokenizer_kwargs": {"use_fast": False}}),
+    "spam": (SPAM_MODEL_PATH, {"max_length": None}),
+}
+
+def measure(clf, texts, batch_size, repeat):
+    single = []
+    for _ in range(repeat):
+        for t in texts:
+            start = time.perf_counter()
+            clf.predict_proba([t])
+            single.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for i in range(0, len(texts), batch_size):
+            clf.predict_proba(texts[i:i + batch_size])
+    batched = time.perf_counter() - start
+    return {
+        "p50_ms": statistics.median(single) * 1000,
+        "p95_ms": statistics.quantiles(single, n=20)[-1] * 1000,
+        "throughput": len(texts) * repeat / batched,
+    }
+
+def run(model_key, backends, batch_size, repeat):
+    name, kwargs = MODELS[model_key]
+    print(f"\n== {model_key}: {name}")
+    baseline = None
+    for backend in backends:
+        start = time.perf_counter()
+        clf = SequenceClassifier(name, backend, **kwargs)
+        load_s = time.perf_counter() - start
+        probs = clf.predict_proba(BENCH_CORPUS)
+        labels = probs.argmax(axis=-1)
+        if baseline is None:
+            baseline = (probs, labels)
+        agreement = float((labels == baseline[1]).mean())
+        max_diff = float(np.abs(probs - baseline[0]).max())
+        perf = measure(clf, BENCH_CORPUS, batch_size, repeat)
+        print(
+            f"{backend:>10} (effective: {clf.backend:<9}) load={load_s:6.2f}s "
+            f"labels={agreement * 100:6.2f}% max|Δp|={max_diff:.4f} "
+            f"p50={perf['p50_ms']:7.2f}ms p95={perf['p95_ms']:7.2f}ms "
+            f"batch{batch_size}={perf['throughput']:8.1f} texts/s"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Порівняння бекендів інференсу")
+    parser.add_argument("--model", choices=["sentiment", "spam", "all"], default="all")
+    parser.add_argument("--backends", default=",".join(BACKENDS),
+                        help="перший бекенд у списку — еталон для перевірки збігу")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+    models = ["sentiment", "spam"] if args.model == "all" else [args.model]
+    for model_key in models:
+        run(model_key, backends, args.batch_size, args.repeat)
+
+if __name__ == "__main__":
+    main()
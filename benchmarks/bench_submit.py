@@ -0,0 +1,107 @@
+# benchmarks/bench_submit.py
+# Пропускна здатність /submit при паралельних відправленнях на SQLite у трьох режимах:
+#   baseline — журнал DELETE, synchronous=FULL, коміт на кожен запит (як до WAL)
+#   wal      — WAL + synchronous=NORMAL, коміт на кожен запит
+#   group    — WAL + груповий коміт (DB_GROUP_COMMIT=1)
+# Кожен режим запускається в окремому процесі з власною тимчасовою базою (прагми задаються при підключенні).
+# Фонова класифікація не запускається — вимірюється лише шлях запису.
+#
+#   python -m benchmarks.bench_submit --requests 2000 --concurrency 64
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODES = {
+    "baseline": {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "DB_GROUP_COMMIT": "0"},
+    "wal": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL", "DB_GROUP_COMMIT": "0"},
+    "group": {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL", "DB_GROUP_COMMIT": "1"},
+}
+
+async def run_one(requests: int, concurrency: int) -> dict:
+    import httpx
+
+    from app_main import app
+    from services.db_service import init_db, add_institution
+    from services.group_commit_service import feedback_writer
+    from services.institution_service import institution_registry
+
+    init_db()
+    code = add_institution("Бенчмарк")
+    institution_registry.load()
+
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker(client):
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/submit", data={
+                    "institution_code": code,
+                    "subject": "Тема відгуку",
+                    "text": f"Відгук номер {i}: все добре, дякую.",
+                    "tags": "бенчмарк,черга",
+                })
+                response.raise_for_status()
+            except Exception:
+                # Наприклад, "database is locked" після busy_timeout
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    # raise_app_exceptions=False: помилка одного запиту стає відповіддю 500, а не скасовує решту
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "errors": errors,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+        "avg_batch": feedback_writer.stats()["avg_batch_size"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_one(args.requests, args.concurrency))))
+        return
+
+    print(f"{args.requests} x POST /submit, {args.concurrency} паралельно")
+    print(f"{'mode':<10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'avg batch':>10} {'errors':>7}")
+    for mode in args.modes.split(","):
+        tmp = tempfile.mkdtemp()
+        env = {
+            **os.environ,
+            **MODES[mode],
+            "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+            "ATTACHMENT_STORE_DIR": os.path.join(tmp, "store"),
+            "UPLOAD_TMP_DIR": os.path.join(tmp, "tmp"),
+        }
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_submit", "--child", mode,
+             "--requests", str(args.requests), "--concurrency", str(args.concurrency)],
+            env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:<10} {r['rps']:8.1f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} {r['avg_batch']:10.2f} {r['errors']:7d}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+# benchmarks/corpus.py
+# Фіксований корпус для порівняння бекендів і продуктивності (змішані мови, довжини, спам)
+
+BENCH_CORPUS = [
+    "Дякую викладачам за чудову організацію навчального процесу!",
+    "Вчитель математики постійно запізнюється на уроки і кричить на учнів.",
+    "В їдальні стало значно краще, їжа смачна і свіжа.",
+    "Охоронець був дуже неввічливий, коли я прийшов по довідку.",
+    "Нормально. Нічого особливого.",
+    "У бібліотеці немає потрібних підручників уже третій місяць, а на запити ніхто не відповідає.",
+    "Класний керівник вимагає гроші на ремонт класу без жодних чеків.",
+    "Все супер, дякую!!!",
+    "The new schedule is much more convenient, thank you.",
+    "Nobody answers the phone at the administration office, it is impossible to get help.",
+    "It's fine I guess.",
+    "Teachers are friendly and helpful, I really enjoy the lessons.",
+    "Спасибо за помощь, всё решили быстро.",
+    "Ужасное отношение к студентам в деканате.",
+    "Dziękuję za szybką odpowiedź.",
+    "WIN A FREE IPHONE!!! Click http://free-prizes.example now!!!",
+    "Купуйте дешеві кросівки тут: bit.ly/xxxxx знижки 90% тільки сьогодні",
+    "asdfasdf asdf asdf qwerty",
+    "Earn $5000 a week from home, no experience needed, contact us on telegram",
+    "ок",
+    "Прошу звернути увагу на стан туалетів на другому поверсі: не працюють крани, немає мила, "
+    "двері не зачиняються. Ми неодноразово повідомляли про це черговому, але нічого не змінилося. "
+    "Будь ласка, вирішіть цю проблему якнайшвидше, бо це питання гігієни та здоров'я учнів.",
+    "Викладач з фізики пояснює дуже зрозуміло, завжди відповідає на запитання після пар "
+    "і дає корисні додаткові матеріали. Хотілося б більше таких викладачів.",
+    "I want to report repeated bullying in the 7-B class during breaks; the teachers on duty "
+    "do not react even when students ask them for help.",
+    "Дуже погано.",
+]
@@ -1,11 +1,22 @@
-from fastapi import APIRouter, Request, Depends, Form
-from fastapi.responses import HTMLResponse, JSONResponse
+import asyncio
+import csv
+import hmac
+import html
+import io
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Request, Depends, Form, HTTPException, File, UploadFile
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
 
+from services.async_db_service import run_db
 from services.auth_service import verify_credentials, hash_password
 from services.db_service import (
-    add_institution, get_all_institutions, load_all_feedback_for_institution,
+    add_institution, add_institutions_bulk, get_institutions_by_id_range, load_feedback_page,
     verify_admin_user, update_admin_password,
     get_feedback_secret_text_by_id_and_code,
     get_feedback_secret_meta_by_id_and_code,
@@ -13,7 +24,25 @@ from services.db_service import (
     validate_institution_code,
     get_attachments_for_feedback,
     get_feedback_stats,
+    get_feedback_timeseries,
+    rollup_bucket,
+    utcnow,
+    TIMESERIES_MAX_BUCKETS,
+    get_tag_facets,
+    get_duplicate_clusters,
+    iter_feedback_for_export,
+    get_attachment,
 )
+from services.batching_service import all_batcher_stats
+from services.cache_service import all_cache_stats
+from services.dedup_service import dedup_index
+from services.executor_service import INFERENCE_EXECUTOR
+from services.institution_service import institution_registry, parse_institutions_csv, MAX_IMPORT_BYTES
+from services.group_commit_service import feedback_writer
+from services.export_service import EXPORT_FORMATS, iter_export, check_parquet_available
+from services.ingest_service import INGEST_FORMATS, IngestTooLarge, detect_format, ingest, spool_upload
+from services.search_service import search_feedback
+from services.upload_service import blob_path, INLINE_CONTENT_TYPES, UPLOAD_DIR
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app_templates")
@@ -25,7 +54,7 @@ class SecretTextRequest(BaseModel):
 
 @router.get("/admin", response_class=HTMLResponse)
 async def admin_panel(request: Request, user: str = Depends(verify_credentials)):
-    institutions = get_all_institutions()
+    institutions = await institution_registry.all_async()
     return templates.TemplateResponse("admin.html", {
         "request": request,
         "institutions": institutions,
@@ -42,6 +71,8 @@ async def get_feedbacks(
     sentiment: str = 'all',
     length: str = 'all',
     order: str = 'desc',
+    tags_mode: str = 'any',
+    cursor: int | None = None,
     user: str = Depends(verify_credentials)
 ):
     tags = request.query_params.get('tags', 'all')
@@ -52,17 +83,75 @@ async def get_feedbacks(
             "selected_institution": code or ""
         })
 
-    feedbacks = load_all_feedback_for_institution(
+    feedbacks, next_cursor = await run_db(
+        load_feedback_page,
         code,
         spam_filter=spam,
         sentiment_filter=sentiment,
         length_filter=length,
         order=order,
-        tags_filter=tags
+        tags_filter=tags,
+        tags_mode=tags_mode,
+        cursor=cursor
     )
-    return templates.TemplateResponse("partials/feedbacks_table.html", {
+    next_page_url = None
+    if next_cursor is not None:
+        next_page_url = "/admin/feedbacks?" + urlencode({
+            "code": code, "spam": spam, "sentiment": sentiment, "length": length,
+            "order": order, "tags": tags, "tags_mode": tags_mode, "cursor": next_cursor,
+        })
+    # Наступні сторінки підвантажуються при прокручуванні: віддаємо лише рядки
+    template = "partials/feedbacks_rows.html" if cursor is not None else "partials/feedbacks_table.html"
+    return templates.TemplateResponse(template, {
         "request": request,
         "feedbacks": feedbacks,
+        "next_page_url": next_page_url,
+        "selected_institution": code
+    })
+
+@router.get("/admin/search", response_class=HTMLResponse)
+async def search_feedbacks(
+    request: Request,
+    code: str = None,
+    q: str = "",
+    spam: str = 'all',
+    sentiment: str = 'all',
+    length: str = 'all',
+    tags: str = 'all',
+    tags_mode: str = 'any',
+    page: int = 1,
+    user: str = Depends(verify_credentials)
+):
+    if not code or not validate_institution_code(code):
+        return templates.TemplateResponse("partials/feedbacks_table.html", {
+            "request": request,
+            "feedbacks": [],
+            "selected_institution": code or ""
+        })
+
+    page = max(page, 1)
+    feedbacks, has_more = await run_db(
+        search_feedback,
+        code,
+        q,
+        spam_filter=spam,
+        sentiment_filter=sentiment,
+        length_filter=length,
+        tags_filter=tags,
+        tags_mode=tags_mode,
+        page=page
+    )
+    next_page_url = None
+    if has_more:
+        next_page_url = "/admin/search?" + urlencode({
+            "code": code, "q": q, "spam": spam, "sentiment": sentiment, "length": length,
+            "tags": tags, "tags_mode": tags_mode, "page": page + 1,
+        })
+    template = "partials/feedbacks_rows.html" if page > 1 else "partials/feedbacks_table.html"
+    return templates.TemplateResponse(template, {
+        "request": request,
+        "feedbacks": feedbacks,
+        "next_page_url": next_page_url,
         "selected_institution": code
     })
 
@@ -79,7 +168,7 @@ async def add_new_institution(
     official_name: str = Form(...),
     user: str = Depends(verify_credentials)
 ):
-    code = add_institution(official_name)
+    code = await asyncio.to_thread(add_institution, official_name)
     message = f"Інституцію '{official_name}' успішно додано з кодом: {code}"
     headers = {"HX-Trigger": "institutionAdded"}
     return templates.TemplateResponse("partials/add_institution_form.html", {
@@ -87,19 +176,82 @@ async def add_new_institution(
         "message": message
     }, headers=headers)
 
+@router.get("/admin/institutions/import", response_class=HTMLResponse)
+async def import_institutions_form(request: Request, user: str = Depends(verify_credentials)):
+    return templates.TemplateResponse("partials/import_institutions_form.html", {
+        "request": request
+    })
+
+@router.post("/admin/institutions/import", response_class=HTMLResponse)
+async def import_institutions(
+    request: Request,
+    file: UploadFile = File(...),
+    user: str = Depends(verify_credentials)
+):
+    data = await file.read(MAX_IMPORT_BYTES + 1)
+    error = None
+    if len(data) > MAX_IMPORT_BYTES:
+        error = f"Файл завеликий (макс. {MAX_IMPORT_BYTES // (1024 * 1024)} МБ)."
+    else:
+        try:
+            names = parse_institutions_csv(data)
+            if not names:
+                error = "У файлі не знайдено жодної назви."
+        except ValueError as e:
+            error = str(e)
+    if error:
+        return templates.TemplateResponse("partials/import_institutions_form.html", {
+            "request": request,
+            "error": error
+        })
+
+    created = await asyncio.to_thread(add_institutions_bulk, names)
+    ids = [inst_id for inst_id, _, _ in created]
+    return templates.TemplateResponse("partials/import_institutions_form.html", {
+        "request": request,
+        "imported": len(created),
+        "first_id": min(ids),
+        "last_id": max(ids)
+    }, headers={"HX-Trigger": "institutionAdded"})
+
+@router.get("/admin/institutions/sheet")
+async def institutions_sheet(
+    request: Request,
+    first_id: int,
+    last_id: int,
+    format: str = "html",
+    user: str = Depends(verify_credentials)
+):
+    institutions = await run_db(get_institutions_by_id_range, first_id, last_id)
+    filename = f"institutions_{first_id}-{last_id}"
+    if format == "csv":
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["official_name", "code"])
+        writer.writerows((name, code) for _, name, code in institutions)
+        return Response(
+            "\ufeff" + out.getvalue(),
+            media_type="text/csv; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'}
+        )
+    return templates.TemplateResponse("institutions_sheet.html", {
+        "request": request,
+        "institutions": institutions
+    })
+
 @router.get("/admin/institutions_options", response_class=HTMLResponse)
 async def institutions_options(
     current: str | None = None,
     user: str = Depends(verify_credentials)
 ):
-    institutions = get_all_institutions()
+    institutions = await institution_registry.all_async()
     options = [
         f'<option value="" disabled{" selected" if not current else ""}>'
         'Оберіть інституцію</option>'
     ]
     for inst in institutions:
         sel = ' selected' if current == inst.code else ''
-        options.append(f'<option value="{inst.code}"{sel}>{inst.official_name}</option>')
+        options.append(f'<option value="{inst.code}"{sel}>{html.escape(inst.official_name)}</option>')
     return HTMLResponse(content="".join(options))
 
 @router.get("/admin/change_password", response_class=HTMLResponse)
@@ -124,11 +276,12 @@ async def change_password(
 
     if new_password != confirm_password:
         error = "Новий пароль і підтвердження не співпадають."
-    elif not verify_admin_user(user, old_password):
+    elif not await asyncio.to_thread(verify_admin_user, user, old_password):
         error = "Старий пароль неправильний."
     else:
-        hashed_password = hash_password(new_password).decode()
-        update_admin_password(user, hashed_password)
+        # bcrypt — у пулі потоків, щоб не зупиняти event loop
+        hashed_password = (await asyncio.to_thread(hash_password, new_password)).decode()
+        await asyncio.to_thread(update_admin_password, user, hashed_password)
         success = "Пароль успішно змінено."
 
     return templates.TemplateResponse("change_password.html", {
@@ -138,17 +291,111 @@ async def change_password(
         "success": success
     })
 
+async def _secret_password_ok(password: str) -> bool:
+    real_password = await run_db(get_secret_view_password)
+    return bool(real_password) and hmac.compare_digest(password.encode(), real_password.encode())
+
+def _export_response(code, fmt, spam, sentiment, length, tags, tags_mode, include_secret):
+    if not validate_institution_code(code):
+        return JSONResponse({"error": "Invalid code"}, status_code=400)
+    if fmt not in EXPORT_FORMATS:
+        return JSONResponse({"error": "Invalid format"}, status_code=400)
+    if fmt == "parquet":
+        try:
+            check_parquet_available()
+        except RuntimeError as e:
+            return JSONResponse({"error": str(e)}, status_code=501)
+    rows = iter_feedback_for_export(
+        code,
+        spam_filter=spam,
+        sentiment_filter=sentiment,
+        length_filter=length,
+        tags_filter=tags,
+        tags_mode=tags_mode,
+        include_secret=include_secret
+    )
+    media_type, ext = EXPORT_FORMATS[fmt]
+    # Синхронний генератор StreamingResponse обходить у пулі потоків — читання з БД не блокує event loop
+    return StreamingResponse(
+        iter_export(rows, fmt, include_secret),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="feedback_{code}.{ext}"'}
+    )
+
+@router.get("/admin/export")
+async def export_feedbacks(
+    code: str,
+    format: str = "csv",
+    spam: str = 'all',
+    sentiment: str = 'all',
+    length: str = 'all',
+    tags: str = 'all',
+    tags_mode: str = 'any',
+    user: str = Depends(verify_credentials)
+):
+    return _export_response(code, format, spam, sentiment, length, tags, tags_mode, include_secret=False)
+
+@router.post("/admin/export")
+async def export_feedbacks_with_secret(
+    code: str = Form(...),
+    format: str = Form("csv"),
+    spam: str = Form('all'),
+    sentiment: str = Form('all'),
+    length: str = Form('all'),
+    tags: str = Form('all'),
+    tags_mode: str = Form('any'),
+    password: str = Form(""),
+    user: str = Depends(verify_credentials)
+):
+    # Секретний текст потрапляє в експорт лише з паролем перегляду секретів (у тілі POST, а не в URL)
+    include_secret = bool(password)
+    if include_secret and not await _secret_password_ok(password):
+        return JSONResponse({"error": "Неправильний пароль."}, status_code=403)
+    return _export_response(code, format, spam, sentiment, length, tags, tags_mode, include_secret)
+
+@router.post("/admin/ingest")
+async def ingest_feedbacks(
+    code: str = Form(...),
+    format: str = Form(""),
+    file: UploadFile = File(...),
+    user: str = Depends(verify_credentials)
+):
+    # Масове завантаження: події (помилки рядків і прогрес після кожної пачки) віддаються як NDJSON
+    code = code.strip()
+    if not await institution_registry.get_async(code):
+        return JSONResponse({"error": "Invalid code"}, status_code=400)
+    fmt = format or detect_format(file.filename)
+    if fmt not in INGEST_FORMATS:
+        return JSONResponse({"error": "Invalid format"}, status_code=400)
+    try:
+        stream = await spool_upload(file)
+    except IngestTooLarge as e:
+        return JSONResponse({"error": str(e)}, status_code=413)
+
+    async def events():
+        try:
+            async for event in ingest(code, stream, fmt):
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        finally:
+            stream.close()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def _load_secret(feedback_id: int, code: str, db=None):
+    return (
+        get_feedback_secret_text_by_id_and_code(feedback_id, code, db=db),
+        get_feedback_secret_meta_by_id_and_code(feedback_id, code, db=db),
+    )
+
 @router.post("/admin/get_secret_text")
 async def get_secret_text(
     request_data: SecretTextRequest,
     user: str = Depends(verify_credentials)
 ):
-    real_password = get_secret_view_password()
-    if request_data.password != real_password:
+    if not await _secret_password_ok(request_data.password):
         return JSONResponse({"success": False, "error": "Неправильний пароль."})
 
-    secret_text = get_feedback_secret_text_by_id_and_code(request_data.id, request_data.code)
-    sentiment, spam, _score = get_feedback_secret_meta_by_id_and_code(request_data.id, request_data.code)
+    secret_text, (sentiment, spam, _score) = await run_db(_load_secret, request_data.id, request_data.code)
 
     if secret_text is None:
         return JSONResponse({"success": False, "error": "Секретний текст не знайдено."})
@@ -169,14 +416,113 @@ async def institution_stats(
 ):
     if not validate_institution_code(code):
         return JSONResponse({"error": "Invalid code"}, status_code=400)
-    stats = get_feedback_stats(code, metric)
+    stats = await run_db(get_feedback_stats, code, metric)
     return JSONResponse(stats)
 
 
+def _as_utc(dt: datetime) -> datetime:
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+@router.get("/admin/stats/timeseries")
+async def institution_timeseries(
+    code: str,
+    metric: str = "sentiment",
+    granularity: str = "day",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    user: str = Depends(verify_credentials)
+):
+    if not validate_institution_code(code):
+        return JSONResponse({"error": "Invalid code"}, status_code=400)
+    if granularity not in ("hour", "day"):
+        return JSONResponse({"error": "Invalid granularity"}, status_code=400)
+    step = timedelta(hours=1) if granularity == "hour" else timedelta(days=1)
+    # Час без поясу вважається UTC; за замовчуванням останні 48 годин або 30 днів
+    end = _as_utc(end) if end else utcnow()
+    start = _as_utc(start) if start else end - step * (48 if granularity == "hour" else 30)
+    if start >= end or (end - start) / step > TIMESERIES_MAX_BUCKETS:
+        return JSONResponse({"error": "Invalid range"}, status_code=400)
+
+    buckets = dict(await run_db(get_feedback_timeseries, code, granularity, start, end, metric))
+    # Порожні інтервали теж повертаються, щоб графік мав рівномірну вісь часу
+    series = []
+    bucket = rollup_bucket(start, granularity)
+    while bucket < end:
+        series.append({"start": bucket.isoformat() + "Z", "counts": buckets.get(bucket, {})})
+        bucket += step
+    return JSONResponse({"metric": metric, "granularity": granularity, "series": series})
+
+
+@router.get("/admin/tag_facets")
+async def tag_facets(code: str, user: str = Depends(verify_credentials)):
+    if not validate_institution_code(code):
+        return JSONResponse({"error": "Invalid code"}, status_code=400)
+    return JSONResponse({"code": code, "tags": await run_db(get_tag_facets, code)})
+
+
+@router.get("/admin/inference_stats")
+async def inference_stats(user: str = Depends(verify_credentials)):
+    return JSONResponse({
+        "batchers": all_batcher_stats(),
+        # За INFERENCE_EXECUTOR=process — лише перевірки кешу в головному процесі
+        "inference_executor": INFERENCE_EXECUTOR,
+        "caches": all_cache_stats(),
+        "dedup": dedup_index.stats(),
+        "group_commit": feedback_writer.stats(),
+    })
+
+
+@router.get("/admin/duplicates", response_class=HTMLResponse)
+async def duplicate_clusters(request: Request, code: str, user: str = Depends(verify_credentials)):
+    clusters = await run_db(get_duplicate_clusters, code) if validate_institution_code(code) else []
+    return templates.TemplateResponse("partials/duplicate_clusters.html", {
+        "request": request,
+        "clusters": clusters
+    })
+
+
 @router.get("/admin/attachments/{feedback_id}", response_class=HTMLResponse)
 async def attachments_view(request: Request, feedback_id: int, user: str = Depends(verify_credentials)):
-    files = get_attachments_for_feedback(feedback_id)
+    files = await run_db(get_attachments_for_feedback, feedback_id)
     return templates.TemplateResponse(
         "attachments_list.html",
         {"request": request, "attachments": files, "feedback_id": feedback_id}
     )
+
+
+@router.get("/admin/files/{attachment_id}")
+async def attachment_file(request: Request, attachment_id: int, user: str = Depends(verify_credentials)):
+    attachment = await run_db(get_attachment, attachment_id)
+    if attachment is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    filename, stored_path, sha256, content_type = attachment
+
+    if sha256:
+        # Вміст блобу ніколи не змінюється, тож ETag — це його хеш, а кешувати можна назавжди
+        path = blob_path(sha256)
+        etag = f'"{sha256}"'
+        headers = {"ETag": etag, "Cache-Control": "private, max-age=31536000, immutable"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if if_none_match.strip() == "*" or etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+    else:
+        # Старі вкладення: лише файли всередині uploads/
+        path = stored_path
+        if os.path.commonpath([os.path.realpath(path), os.path.realpath(UPLOAD_DIR)]) != os.path.realpath(UPLOAD_DIR):
+            raise HTTPException(status_code=404, detail="Not found")
+        headers = {"Cache-Control": "private, max-age=3600"}
+
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Not found")
+    # Вкладення надсилають анонімні користувачі: відкрите inline HTML/SVG виконалося б у походженні адмінки
+    headers["X-Content-Type-Options"] = "nosniff"
+    inline = content_type in INLINE_CONTENT_TYPES
+    # FileResponse сам обробляє заголовок Range (206 Partial Content)
+    return FileResponse(
+        path,
+        media_type=content_type,
+        filename=filename,
+        content_disposition_type="inline" if inline else "attachment",
+        headers=headers,
+    )
@@ -1,21 +1,28 @@
-from fastapi import APIRouter, Request, Form, File, UploadFile
+from fastapi import APIRouter, Request, Depends, Form, File, UploadFile
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, List
-import os
-from uuid import uuid4
 
-from services.nlp_service import detect_language, analyze_sentiment
-from services.spam_service import detect_spam
+from services.classification_service import classification_worker
+from services.async_db_service import get_async_db
 from services.db_service import (
     save_feedback_for_institution,
     save_attachments,
-    get_institution_by_code,
+)
+from services.group_commit_service import DB_GROUP_COMMIT, feedback_writer
+from services.institution_service import institution_registry
+from services.metrics_service import stage_timer
+from services.upload_service import (
+    MAX_UPLOAD_FILES,
+    UploadTooLarge,
+    stage_uploads,
+    discard_uploads,
+    commit_uploads,
 )
 
 router = APIRouter()
 templates = Jinja2Templates(directory="app_templates")
-UPLOAD_DIR = "uploads"
 
 @router.get("/", response_class=HTMLResponse)
 async def code_or_form(request: Request):
@@ -24,7 +31,7 @@ async def code_or_form(request: Request):
 @router.post("/enter_code", response_class=HTMLResponse)
 async def check_institution_code(request: Request, code: str = Form(...)):
     code = code.strip()
-    institution = get_institution_by_code(code)
+    institution = await institution_registry.get_async(code)
     if not institution:
         return templates.TemplateResponse("code_input.html", {
             "request": request,
@@ -38,6 +45,42 @@ async def check_institution_code(request: Request, code: str = Form(...)):
         "error": None
     })
 
+def _save_submission(db, institution_code, text, tags, subject, secret_text, attachments):
+    # Відгук і вкладення — в одній сесії без коміту (коміт робить обробник або груповий писач)
+    feedback_id = save_feedback_for_institution(
+        institution_code,
+        text,
+        tags=tags,
+        subject=subject,
+        secret_text=secret_text,
+        db=db
+    )
+    if attachments:
+        save_attachments(feedback_id, attachments, db=db)
+    return feedback_id
+
+def _validation_error(subject, text, secret_text, tags, files) -> str | None:
+    if len(files) > MAX_UPLOAD_FILES:
+        return f"Можна додати максимум {MAX_UPLOAD_FILES} файлів."
+    if len(subject) < 3:
+        return "Тема відгуку занадто коротка."
+    if len(subject) > 255:
+        return "Тема відгуку занадто довга (макс. 255 символів)."
+    if len(text) < 3:
+        return "Зміст відгуку занадто короткий."
+    if len(text) > 5000:
+        return "Зміст відгуку занадто довгий (макс. 5000 символів)."
+    if secret_text and len(secret_text) > 5000:
+        return "Секретний зміст занадто довгий (макс. 5000 символів)."
+    if tags and len(tags) > 255:
+        return "Занадто багато тегів або занадто довгий рядок тегів (макс. 255 символів)."
+    return None
+
+def _render(template: str, context: dict):
+    # TemplateResponse рендерить шаблон одразу при створенні
+    with stage_timer("template_render"):
+        return templates.TemplateResponse(template, context)
+
 @router.post("/submit", response_class=HTMLResponse)
 async def submit_feedback(
     request: Request,
@@ -46,100 +89,61 @@ async def submit_feedback(
     text: str = Form(...),
     secret_text: Optional[str] = Form(None),
     tags: Optional[str] = Form(""),
-    files: List[UploadFile] = File([])
+    files: List[UploadFile] = File([]),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    institution_code = institution_code.strip()
-    subject = subject.strip()
-    text = text.strip()
-    secret_text = (secret_text or "").strip()
-    tags = tags.strip()
+    with stage_timer("validation"):
+        institution_code = institution_code.strip()
+        subject = subject.strip()
+        text = text.strip()
+        secret_text = (secret_text or "").strip()
+        tags = tags.strip()
+        known_code = bool(await institution_registry.get_async(institution_code))
+        error = _validation_error(subject, text, secret_text, tags, files) if known_code else None
 
-    if len(files) > 5:
-        return templates.TemplateResponse("feedback_form.html", {
-            "request": request,
-            "institution_code": institution_code,
-            "error": "Можна додати максимум 5 файлів."
-        })
-
-    attachments = []
-    feedback_folder = uuid4().hex
-    for upload in files:
-        if upload.filename:
-            safe_name = os.path.basename(upload.filename)
-            folder_path = os.path.join(UPLOAD_DIR, feedback_folder)
-            os.makedirs(folder_path, exist_ok=True)
-            unique_name = f"{uuid4().hex}_{safe_name}"
-            file_path = os.path.join(folder_path, unique_name)
-            with open(file_path, "wb") as f:
-                content = await upload.read()
-                f.write(content)
-            attachments.append((upload.filename, file_path))
-
-    if len(subject) < 3:
-        return templates.TemplateResponse("feedback_form.html", {
-            "request": request,
-            "institution_code": institution_code,
-            "error": "Тема відгуку занадто коротка."
-        })
-    if len(subject) > 255:
-        return templates.TemplateResponse("feedback_form.html", {
+    if not known_code:
+        return _render("code_input.html", {
             "request": request,
-            "institution_code": institution_code,
-            "error": "Тема відгуку занадто довга (макс. 255 символів)."
-        })
-    if len(text) < 3:
-        return templates.TemplateResponse("feedback_form.html", {
-            "request": request,
-            "institution_code": institution_code,
-            "error": "Зміст відгуку занадто короткий."
-        })
-    if len(text) > 5000:
-        return templates.TemplateResponse("feedback_form.html", {
-            "request": request,
-            "institution_code": institution_code,
-            "error": "Зміст відгуку занадто довгий (макс. 5000 символів)."
+            "error": "Некоректний код інституції."
         })
-    if secret_text and len(secret_text) > 5000:
-        return templates.TemplateResponse("feedback_form.html", {
+    if error:
+        return _render("feedback_form.html", {
             "request": request,
             "institution_code": institution_code,
-            "error": "Секретний зміст занадто довгий (макс. 5000 символів)."
+            "error": error
         })
-    if tags and len(tags) > 255:
-        return templates.TemplateResponse("feedback_form.html", {
+
+    # Файли пишуться потоково у тимчасові та переносяться у сховище лише після успішної валідації
+    try:
+        with stage_timer("file_write"):
+            staged = await stage_uploads(files)
+    except UploadTooLarge as e:
+        return _render("feedback_form.html", {
             "request": request,
             "institution_code": institution_code,
-            "error": "Занадто багато тегів або занадто довгий рядок тегів (макс. 255 символів)."
+            "error": str(e)
         })
 
-    lang = detect_language(text)
-    sentiment = analyze_sentiment(text)
-    spam, score = detect_spam(text)
+    try:
+        # Блоби переносяться у сховище до запису в БД, щоб транзакція (і блокування запису SQLite)
+        # не чекала на файлову систему. Класифікація виконується у фоні (services/classification_service.py)
+        with stage_timer("file_commit"):
+            attachments = await commit_uploads(staged)
+        args = (institution_code, text, tags, subject, secret_text, attachments)
+        with stage_timer("db_insert"):
+            if DB_GROUP_COMMIT:
+                await feedback_writer.run(_save_submission, *args)
+            else:
+                # Один unit of work на запит: відгук, теги, лічильники й вкладення — одним комітом
+                await db.run_sync(_save_submission, *args)
+                await db.commit()
+    except BaseException:
+        # Блоби без посилань прибере `python manage.py gc-attachments`
+        await discard_uploads(staged)
+        raise
 
-    sentiment_secret = analyze_sentiment(secret_text) if secret_text else None
-    spam_secret, score_secret = detect_spam(secret_text) if secret_text else (0, 0.0)
+    classification_worker.notify()
 
-    feedback_id = save_feedback_for_institution(
-        institution_code,
-        text,
-        lang,
-        sentiment,
-        spam,
-        tags=tags,
-        subject=subject,
-        secret_text=secret_text,
-        secret_sentiment=sentiment_secret,
-        secret_spam=spam_secret,
-        secret_spam_score=score_secret
-    )
-
-    if attachments:
-        save_attachments(feedback_id, attachments)
-
-    return templates.TemplateResponse("success.html", {
-        "request": request,
-        "lang": lang,
-        "sentiment": sentiment,
-        "spam": spam,
-        "score": f"{score:.3f}"
+    return _render("success.html", {
+        "request": request
     })
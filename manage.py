@@ -0,0 +1,293 @@
+#manage.py — службові команди: обслуговування БД і сховища вкладень.
+#Запуск: python manage.py <команда> [параметри], список команд: python manage.py --help
+import argparse
+import sys
+
+from services.db_service import init_db
+from services.upload_service import BLOB_GC_GRACE_SECONDS
+
+
+def cmd_gc_attachments(args):
+    from services.db_service import get_referenced_attachment_hashes
+    from services.upload_service import gc_blobs
+
+    referenced = get_referenced_attachment_hashes()
+    removed, freed = gc_blobs(referenced, dry_run=args.dry_run, grace_seconds=args.grace_seconds)
+    action = "Буде видалено" if args.dry_run else "Видалено"
+    print(f"{action} блобів без посилань: {removed} ({freed / (1024 * 1024):.1f} МБ)")
+
+
+def cmd_backfill_tags(args):
+    from services.db_service import backfill_feedback_tags
+
+    added = backfill_feedback_tags(batch_size=args.batch_size)
+    print(f"Додано записів тегів: {added}")
+
+
+def cmd_rebuild_search(args):
+    from services.search_service import rebuild_search_index
+
+    rebuild_search_index()
+    print("Пошуковий індекс перебудовано")
+
+
+def cmd_reconcile_counters(args):
+    from services.db_service import reconcile_feedback_counters
+
+    drift = reconcile_feedback_counters(fix=not args.dry_run)
+    for code, counter, stored, actual in drift:
+        print(f"{code} {counter}: {stored} -> {actual}")
+    if not drift:
+        print("Лічильники збігаються з даними")
+    elif not args.dry_run:
+        print(f"Виправлено лічильників: {len(drift)}")
+
+
+def cmd_rebuild_rollups(args):
+    from services.db_service import rebuild_feedback_rollups
+
+    seen = rebuild_feedback_rollups(batch_size=args.batch_size)
+    print(f"Агрегати перераховано з {seen} відгуків")
+
+
+def cmd_check_indexes(args):
+    from services.db_service import expected_feedback_index, explain_feedback_filters
+
+    failed = 0
+    for filters, index, plan in explain_feedback_filters():
+        label = ", ".join(f"{k}={v}" for k, v in filters.items())
+        # Кожна комбінація фільтрів має йти своїм складеним індексом без окремого сортування
+        # (одноколонковий ix_feedbacks_institution_code видаляється міграцією)
+        expected = expected_feedback_index(filters)
+        ok = index == expected and "TEMP B-TREE" not in plan
+        failed += not ok
+        print(f"{'OK  ' if ok else 'FAIL'} {label}: {index or 'без індексу'}" + ("" if ok else f" (очікується {expected})"))
+        if args.verbose or not ok:
+            print("     " + plan.replace("\n", "\n     "))
+    if failed:
+        sys.exit(1)
+
+
+def cmd_import_institutions(args):
+    import csv
+    import time
+
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+    from services.db_service import add_institutions_bulk
+    from services.institution_service import parse_institutions_csv
+
+    with open(args.csv_file, "rb") as f:
+        names = parse_institutions_csv(f.read())
+    start = time.perf_counter()
+    created = add_institutions_bulk(names)
+    print(f"Додано інституцій: {len(created)} за {time.perf_counter() - start:.2f} с")
+
+    if args.codes:
+        with open(args.codes, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["official_name", "code"])
+            writer.writerows((name, code) for _, name, code in created)
+        print(f"Коди: {args.codes}")
+    if args.sheet:
+        env = Environment(loader=FileSystemLoader("app_templates"), autoescape=select_autoescape())
+        with open(args.sheet, "w", encoding="utf-8") as f:
+            f.write(env.get_template("institutions_sheet.html").render(institutions=created))
+        print(f"Аркуш для друку: {args.sheet}")
+
+
+def cmd_export(args):
+    import getpass
+    import hmac
+
+    from services.db_service import get_secret_view_password, iter_feedback_for_export
+    from services.export_service import iter_export
+
+    include_secret = False
+    if args.with_secret:
+        password = getpass.getpass("Пароль перегляду секретів: ")
+        real_password = get_secret_view_password()
+        if not real_password or not hmac.compare_digest(password.encode(), real_password.encode()):
+            sys.exit("Неправильний пароль.")
+        include_secret = True
+    rows = iter_feedback_for_export(
+        args.code,
+        spam_filter=args.spam,
+        sentiment_filter=args.sentiment,
+        length_filter=args.length,
+        tags_filter=args.tags,
+        tags_mode=args.tags_mode,
+        include_secret=include_secret,
+        batch_size=args.batch_size,
+    )
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in iter_export(rows, args.format, include_secret):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+def cmd_ingest(args):
+    import asyncio
+    import time
+
+    from services.executor_service import shutdown_inference_executor
+    from services.ingest_service import INGEST_CHUNK_SIZE, detect_format, ingest
+    from services.institution_service import institution_registry
+
+    institution_registry.load()
+    if not institution_registry.get(args.code):
+        sys.exit(f"Інституцію з кодом {args.code} не знайдено.")
+    fmt = args.format or detect_format(args.file)
+
+    async def run():
+        errors = []
+        start = time.perf_counter()
+        with open(args.file, "rb") as f:
+            async for event in ingest(args.code, f, fmt, chunk_size=args.chunk_size or INGEST_CHUNK_SIZE):
+                if event["event"] == "error":
+                    errors.append(event)
+                elif event["event"] == "progress":
+                    rate = event["processed"] / max(time.perf_counter() - start, 1e-9) * 60
+                    print(
+                        f"\rОброблено {event['processed']}, збережено {event['inserted']}, "
+                        f"помилок {event['failed']} ({rate:.0f} рядків/хв)",
+                        end="", file=sys.stderr, flush=True
+                    )
+                else:
+                    print(file=sys.stderr)
+                    print(
+                        f"Готово за {time.perf_counter() - start:.1f} с: збережено {event['inserted']} "
+                        f"з {event['processed']}, помилок {event['failed']}"
+                    )
+        for error in errors[:args.show_errors]:
+            print(f"  рядок {error['line']}: {error['error']}")
+        if len(errors) > args.show_errors:
+            print(f"  ... і ще {len(errors) - args.show_errors}")
+        return errors
+
+    try:
+        errors = asyncio.run(run())
+    finally:
+        shutdown_inference_executor()
+    if errors:
+        sys.exit(1)
+
+
+def cmd_reclassify(args):
+    import time
+
+    from services.classification_service import model_version
+    from services.db_service import get_model_version_counts
+
+    if args.status:
+        current = model_version()
+        print(f"Поточна версія моделей: {current}")
+        for version, n in get_model_version_counts():
+            print(f"{'*' if version == current else ' '} {n:>10}  {version or '(невідома)'}")
+        return
+
+    from services.reclassify_service import RECLASSIFY_BATCH, RECLASSIFY_WORKERS, run_reclassify
+
+    start = time.perf_counter()
+    started = None
+
+    def progress(checkpoint):
+        nonlocal started
+        started = checkpoint["processed"] if started is None else started
+        rate = (checkpoint["processed"] - started) / max(time.perf_counter() - start, 1e-9) * 60
+        print(
+            f"\rПерекласифіковано {checkpoint['processed']} (мітки змінилися у {checkpoint['changed']}), "
+            f"останній id {checkpoint['last_id']}, {rate:.0f} відгуків/хв",
+            end="", file=sys.stderr, flush=True
+        )
+
+    result = run_reclassify(
+        workers=args.workers or RECLASSIFY_WORKERS,
+        batch_size=args.batch_size or RECLASSIFY_BATCH,
+        restart=args.restart,
+        on_progress=progress,
+    )
+    print(file=sys.stderr)
+    print(
+        f"Готово: {result['processed']} відгуків під версію {result['model_version']}, "
+        f"мітки змінилися у {result['changed']}"
+    )
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Службові команди системи відгуків")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("gc-attachments", help="видалити файли сховища, на які не посилається жодне вкладення")
+    p.add_argument("--dry-run", action="store_true", help="лише показати, що буде видалено")
+    p.add_argument("--grace-seconds", type=int, default=BLOB_GC_GRACE_SECONDS,
+                   help="не чіпати файли, змінені пізніше ніж стільки секунд тому")
+    p.set_defaults(func=cmd_gc_attachments)
+
+    p = sub.add_parser("backfill-tags", help="заповнити таблицю feedback_tags з поля tags старих відгуків")
+    p.add_argument("--batch-size", type=int, default=1000, help="скільки відгуків обробляти за одну транзакцію")
+    p.set_defaults(func=cmd_backfill_tags)
+
+    p = sub.add_parser("rebuild-search", help="перебудувати повнотекстовий індекс відгуків")
+    p.set_defaults(func=cmd_rebuild_search)
+
+    p = sub.add_parser("reconcile-counters", help="перерахувати лічильники статистики і показати розбіжності")
+    p.add_argument("--dry-run", action="store_true", help="лише показати розбіжності, не виправляти")
+    p.set_defaults(func=cmd_reconcile_counters)
+
+    p = sub.add_parser("rebuild-rollups", help="перерахувати погодинні й подобові агрегати з таблиці відгуків")
+    p.add_argument("--batch-size", type=int, default=1000, help="розмір пачки при читанні і записі")
+    p.set_defaults(func=cmd_rebuild_rollups)
+
+    p = sub.add_parser("check-indexes", help="перевірити через EXPLAIN, що фільтри адмінки використовують індекси")
+    p.add_argument("--verbose", action="store_true", help="показати повні плани запитів")
+    p.set_defaults(func=cmd_check_indexes)
+
+    p = sub.add_parser("import-institutions", help="масово додати інституції з CSV (одна транзакція)")
+    p.add_argument("csv_file", help="CSV з колонкою official_name/назва або одна назва на рядок")
+    p.add_argument("--codes", help="записати CSV з назвами і згенерованими кодами")
+    p.add_argument("--sheet", help="записати HTML-аркуш для друку з кодами і QR-кодами")
+    p.set_defaults(func=cmd_import_institutions)
+
+    p = sub.add_parser("export", help="потоково вивантажити відгуки інституції у CSV/NDJSON/Parquet")
+    p.add_argument("--code", required=True, help="код інституції")
+    p.add_argument("--format", choices=["csv", "ndjson", "parquet"], default="csv")
+    p.add_argument("--output", help="файл (за замовчуванням stdout)")
+    p.add_argument("--spam", default="all", choices=["all", "spam", "ham"])
+    p.add_argument("--sentiment", default="all")
+    p.add_argument("--length", default="all", choices=["all", "short", "long"])
+    p.add_argument("--tags", default="all", help="теги через кому")
+    p.add_argument("--tags-mode", default="any", choices=["any", "all"])
+    p.add_argument("--with-secret", action="store_true", help="додати секретний текст (запитає пароль перегляду секретів)")
+    p.add_argument("--batch-size", type=int, default=500, help="скільки рядків читати з БД за раз")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("ingest", help="масово завантажити відгуки з NDJSON/CSV (класифікація пачками)")
+    p.add_argument("file", help="файл .ndjson/.jsonl або .csv з полями text, subject, tags, secret_text, created_at")
+    p.add_argument("--code", required=True, help="код інституції")
+    p.add_argument("--format", choices=["ndjson", "csv"], help="формат (за замовчуванням — за розширенням файлу)")
+    p.add_argument("--chunk-size", type=int, help="скільки рядків у транзакції (за замовчуванням INGEST_CHUNK_SIZE)")
+    p.add_argument("--show-errors", type=int, default=20, help="скільки помилок рядків показати")
+    p.set_defaults(func=cmd_ingest)
+
+    p = sub.add_parser("reclassify", help="перекласифікувати збережені відгуки після оновлення моделей (з продовженням)")
+    p.add_argument("--workers", type=int, help="кількість процесів (за замовчуванням RECLASSIFY_WORKERS)")
+    p.add_argument("--batch-size", type=int, help="скільки відгуків у транзакції (за замовчуванням RECLASSIFY_BATCH)")
+    p.add_argument("--restart", action="store_true", help="почати з початку, ігноруючи збережений прогрес")
+    p.add_argument("--status", action="store_true", help="лише показати, скільки відгуків класифіковано якою версією")
+    p.set_defaults(func=cmd_reclassify)
+
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    init_db()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
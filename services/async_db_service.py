@@ -0,0 +1,70 @@
+# services/async_db_service.py
+# Асинхронний доступ до БД для обробників FastAPI: запити йдуть через async-драйвер
+# (aiosqlite для SQLite, asyncpg для PostgreSQL — за DATABASE_URL), тож очікування БД
+# не блокує event loop. Функції db_service не дублюються: run_db виконує ту саму синхронну
+# функцію через AsyncSession.run_sync, передаючи їй сесію як db=...
+
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from services.db_service import DATABASE_URL, pool_options, sqlite_pragmas
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+def async_database_url(url: str) -> str:
+    # sqlite:///feedback.db -> sqlite+aiosqlite:///feedback.db, postgresql://... -> postgresql+asyncpg://...
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in _ASYNC_DRIVERS:
+        raise ValueError(f"Немає async-драйвера для {backend}; задайте ASYNC_DATABASE_URL")
+    return parsed.set(drivername=_ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+# Явне значення потрібне, якщо параметри URL синхронного драйвера не підходять asyncpg (наприклад, sslmode)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+# Двигун створюється ліниво (перший запит), щоб manage.py та інші синхронні шляхи не потребували async-драйвера
+_engine = None
+_sessionmaker = None
+
+def get_async_engine():
+    global _engine, _sessionmaker
+    if _engine is None:
+        options = pool_options(ASYNC_DATABASE_URL)
+        if options:
+            # aiosqlite у SQLAlchemy 2.0.30 за замовчуванням без пулу (NullPool) — з'єднання відкривалося б на кожен запит
+            options["poolclass"] = AsyncAdaptedQueuePool
+        _engine = create_async_engine(ASYNC_DATABASE_URL, **options)
+        if _engine.dialect.name == "sqlite":
+            event.listen(_engine.sync_engine, "connect", sqlite_pragmas)
+        _sessionmaker = async_sessionmaker(_engine, expire_on_commit=False)
+    return _engine
+
+def async_session():
+    get_async_engine()
+    return _sessionmaker()
+
+async def get_async_db():
+    # Сесія на запит (FastAPI Depends) — async-аналог db_service.get_db
+    async with async_session() as db:
+        yield db
+
+async def run_db(fn, *args, **kwargs):
+    # fn — функція db_service з параметром db; виконується однією транзакцією і повертає її результат.
+    # Функції повертають кортежі/словники, а не ORM-об'єкти, тож після закриття сесії нічого не довантажується
+    async with async_session() as db:
+        result = await db.run_sync(lambda session: fn(*args, db=session, **kwargs))
+        await db.commit()
+        return result
+
+async def dispose_async_engine():
+    global _engine, _sessionmaker
+    if _engine is not None:
+        await _engine.dispose()
+        _engine = _sessionmaker = None
@@ -1,18 +1,84 @@
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
 import bcrypt
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 
-from services.db_service import verify_admin_user
+from services.db_service import get_admin_password_hash
 
 security = HTTPBasic()
 
+# Кеш успішно перевірених облікових даних: HTMX-адмінка робить багато запитів з тим самим
+# паролем, і без кешу кожен із них платить за bcrypt.checkpw. Ключ — HMAC від логіна, пароля
+# і збереженого в БД хешу з випадковим ключем процесу, тож сам пароль у пам'яті не зберігається.
+# На кожен запит читається лише хеш (запит за унікальним username замість bcrypt): після зміни
+# пароля в будь-якому воркері ключ змінюється, і старий пароль одразу перестає працювати.
+# Невдалі спроби не кешуються.
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "300"))  # 0 — вимкнено
+AUTH_CACHE_MAX_ENTRIES = 1024
+
+_cache_key = secrets.token_bytes(32)
+_verified = {}  # hmac -> (username, expires_at)
+_verified_lock = threading.Lock()
+
+def _credentials_digest(username: str, password: str, password_hash: str) -> bytes:
+    return hmac.new(_cache_key, f"{username}\0{password}\0{password_hash}".encode(), hashlib.sha256).digest()
+
+def _is_cached(digest: bytes) -> bool:
+    with _verified_lock:
+        entry = _verified.get(digest)
+        if entry is None:
+            return False
+        if entry[1] < time.monotonic():
+            del _verified[digest]
+            return False
+        return True
+
+def _remember(digest: bytes, username: str):
+    with _verified_lock:
+        if len(_verified) >= AUTH_CACHE_MAX_ENTRIES:
+            now = time.monotonic()
+            for key in [k for k, (_, expires) in _verified.items() if expires < now]:
+                del _verified[key]
+            if len(_verified) >= AUTH_CACHE_MAX_ENTRIES:
+                _verified.clear()
+        _verified[digest] = (username, time.monotonic() + AUTH_CACHE_TTL_SECONDS)
+
+def invalidate_credentials_cache(username: str | None = None):
+    # Викликається при зміні пароля: записи зі старим хешем уже не збіжуться, їх лише прибираємо з пам'яті
+    with _verified_lock:
+        if username is None:
+            _verified.clear()
+        else:
+            for key in [k for k, (user, _) in _verified.items() if user == username]:
+                del _verified[key]
+
 def verify_credentials(creds: HTTPBasicCredentials = Depends(security)):
-    if not verify_admin_user(creds.username, creds.password):
+    password_hash = get_admin_password_hash(creds.username)
+    if password_hash is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Incorrect credentials",
+            headers={"WWW-Authenticate": "Basic"},
+        )
+    digest = None
+    if AUTH_CACHE_TTL_SECONDS > 0:
+        digest = _credentials_digest(creds.username, creds.password, password_hash)
+        if _is_cached(digest):
+            return creds.username
+    if not verify_password(creds.password, password_hash):
         raise HTTPException(
             status_code=401,
             detail="Incorrect credentials",
             headers={"WWW-Authenticate": "Basic"},
         )
+    if digest is not None:
+        _remember(digest, creds.username)
     return creds.username
 
 def hash_password(password: str) -> bytes:
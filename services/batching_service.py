@@ -0,0 +1,185 @@
+# services/batching_service.py
+# Динамічний мікробатчинг: тексти від паралельних запитів збираються у спільну чергу,
+# і модель виконує один forward pass на весь батч замість batch-size-1 на кожен запит.
+# Самі батчі виконуються у пулі інференсу (services/executor_service.py).
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from services.executor_service import get_inference_executor, INFERENCE_WORKERS
+
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+BATCH_MAX_QUEUE = int(os.getenv("BATCH_MAX_QUEUE", "256"))
+BATCH_QUEUE_TIMEOUT_MS = float(os.getenv("BATCH_QUEUE_TIMEOUT_MS", "5000"))
+
+_batchers = []
+
+
+class BatcherOverloaded(RuntimeError):
+    pass
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        name: str,
+        batch_fn,
+        max_batch_size: int = BATCH_MAX_SIZE,
+        max_wait_ms: float = BATCH_MAX_WAIT_MS,
+        max_queue: int = BATCH_MAX_QUEUE,
+        queue_timeout_ms: float = BATCH_QUEUE_TIMEOUT_MS,
+    ):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_queue = max_queue
+        self.queue_timeout = max(0.0, queue_timeout_ms) / 1000
+        # Елемент черги — список (item, future) одного виклику, щоб тексти одного
+        # запиту гарантовано потрапили в один батч.
+        self._queue = queue.Queue(maxsize=max_queue)
+        # Не більше батчів одночасно, ніж воркерів у пулі: поки пул зайнятий,
+        # нові тексти накопичуються в черзі й потрапляють у наступний (більший) батч.
+        self._slots = threading.BoundedSemaphore(INFERENCE_WORKERS)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._sizes = Counter()
+        self._batches = 0
+        self._items = 0
+        self._overflows = 0
+        self._rejected = 0
+        _batchers.append(self)
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._loop, name=f"batcher-{self.name}", daemon=True
+                )
+                self._thread.start()
+
+    def _make_entry(self, items):
+        entry = [(item, Future()) for item in items]
+        return entry, [fut for _, fut in entry]
+
+    def _count(self, overflow=False, rejected=False):
+        with self._lock:
+            self._overflows += overflow
+            self._rejected += rejected
+
+    def submit_many(self, items) -> list[Future]:
+        # Черга обмежена: якщо вона повна, виклик чекає на місце до queue_timeout,
+        # а потім отримує BatcherOverloaded — обсяг інференсу в роботі не росте без меж
+        entry, futures = self._make_entry(items)
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+            return futures
+        except queue.Full:
+            self._count(overflow=True)
+        try:
+            self._queue.put(entry, timeout=self.queue_timeout)
+        except queue.Full:
+            self._count(rejected=True)
+            raise BatcherOverloaded(f"Черга батчера {self.name} переповнена")
+        return futures
+
+    def submit(self, item) -> Future:
+        return self.submit_many([item])[0]
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    async def run_many(self, items) -> list:
+        entry, futures = self._make_entry(items)
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            # Те саме очікування, що й у submit_many, але без блокування event loop
+            self._count(overflow=True)
+            deadline = time.monotonic() + self.queue_timeout
+            while True:
+                await asyncio.sleep(max(self.max_wait, 0.001))
+                try:
+                    self._queue.put_nowait(entry)
+                    break
+                except queue.Full:
+                    if time.monotonic() >= deadline:
+                        self._count(rejected=True)
+                        raise BatcherOverloaded(f"Черга батчера {self.name} переповнена")
+        return [await asyncio.wrap_future(fut) for fut in futures]
+
+    async def run(self, item):
+        return (await self.run_many([item]))[0]
+
+    def _loop(self):
+        while True:
+            batch = list(self._queue.get())
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout <= 0:
+                        batch.extend(self._queue.get_nowait())
+                    else:
+                        batch.extend(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        self._slots.acquire()
+        items = [item for item, _ in batch]
+        try:
+            job = get_inference_executor().submit(self.batch_fn, items)
+        except BaseException as exc:
+            self._slots.release()
+            for _, fut in batch:
+                fut.set_exception(exc)
+            return
+        job.add_done_callback(lambda job: self._complete(batch, job))
+
+    def _complete(self, batch, job):
+        self._slots.release()
+        exc = job.exception()
+        if exc is not None:
+            for _, fut in batch:
+                fut.set_exception(exc)
+            return
+        results = job.result()
+        items = len(batch)
+        with self._lock:
+            self._batches += 1
+            self._items += items
+            self._sizes[items] += 1
+        for (_, fut), result in zip(batch, results):
+            fut.set_result(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "max_queue": self.max_queue,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "overflows": self._overflows,
+                "rejected": self._rejected,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "batch_sizes": dict(sorted(self._sizes.items())),
+            }
+
+
+def all_batcher_stats() -> list[dict]:
+    return [b.stats() for b in _batchers]
@@ -0,0 +1,137 @@
+# services/cache_service.py
+# Кеш результатів інференсу за хешем нормалізованого тексту та ідентичності моделі.
+# Перший рівень — обмежений LRU у пам'яті, другий (опційний) — таблиця inference_cache у БД,
+# що переживає перезапуски. Зміна моделі змінює model_id, тож старі ключі більше не збігаються,
+# а застарілі записи з БД видаляються при першому зверненні.
+# За INFERENCE_EXECUTOR=process кожен процес пулу має власну копію кешу й лічильників:
+# stats() головного процесу їх не бачить (див. README).
+
+import hashlib
+import json
+import os
+import threading
+import unicodedata
+from collections import OrderedDict
+
+from services.db_service import (
+    load_cached_inference,
+    store_cached_inference,
+    purge_inference_cache,
+)
+
+INFERENCE_CACHE_SIZE = int(os.getenv("INFERENCE_CACHE_SIZE", "10000"))
+INFERENCE_CACHE_PERSIST = os.getenv("INFERENCE_CACHE_PERSIST", "0") == "1"
+
+_caches = []
+
+def normalize_text(text: str) -> str:
+    # Лише те, що не впливає на токенізацію: Unicode NFC і пробіли
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+class InferenceCache:
+    def __init__(self, name: str, model_id_fn, decode=lambda v: v,
+                 maxsize: int = INFERENCE_CACHE_SIZE, persist: bool = INFERENCE_CACHE_PERSIST):
+        self.name = name
+        self.model_id_fn = model_id_fn
+        self.decode = decode
+        self.maxsize = maxsize
+        self.persist = persist
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._purged_for = None
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        _caches.append(self)
+
+    def key(self, text: str) -> str:
+        payload = f"{self.model_id_fn()}\0{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _remember(self, key, value):
+        # Викликається під self._lock
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def get(self, text: str):
+        if self.maxsize <= 0:
+            return None
+        key = self.key(text)
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self._hits += 1
+                return self._data[key]
+        return None
+
+    def _ensure_purged(self, model_id):
+        if self._purged_for != model_id:
+            purge_inference_cache(self.name, model_id)
+            self._purged_for = model_id
+
+    def run_batch(self, texts: list, compute) -> list:
+        # compute викликається лише для унікальних текстів, яких немає в кеші
+        model_id = self.model_id_fn()
+        keys = [self.key(t) for t in texts]
+        results = [None] * len(texts)
+        missing = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                if self.maxsize > 0 and key in self._data:
+                    self._data.move_to_end(key)
+                    self._hits += 1
+                    results[i] = self._data[key]
+                else:
+                    missing.setdefault(key, []).append(i)
+
+        if missing and self.persist:
+            self._ensure_purged(model_id)
+            stored = load_cached_inference(list(missing))
+            with self._lock:
+                for key, raw in stored.items():
+                    value = self.decode(json.loads(raw))
+                    for i in missing.pop(key):
+                        results[i] = value
+                    self._disk_hits += 1
+                    self._remember(key, value)
+
+        if missing:
+            order = list(missing)
+            computed = compute([texts[missing[key][0]] for key in order])
+            with self._lock:
+                self._misses += len(order)
+                for key, value in zip(order, computed):
+                    for i in missing[key]:
+                        results[i] = value
+                    if self.maxsize > 0:
+                        self._remember(key, value)
+            if self.persist:
+                store_cached_inference(
+                    self.name, model_id,
+                    [(key, json.dumps(value)) for key, value in zip(order, computed)]
+                )
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                "name": self.name,
+                "model_id": self.model_id_fn(),
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "persist": self.persist,
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "hit_rate": round((self._hits + self._disk_hits) / lookups, 3) if lookups else 0.0,
+            }
+
+def all_cache_stats() -> list[dict]:
+    return [c.stats() for c in _caches]
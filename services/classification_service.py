@@ -0,0 +1,209 @@
+# services/classification_service.py
+# Фонова класифікація відгуків: /submit лише зберігає запис зі статусом pending,
+# а воркер забирає pending-записи з БД (вона ж і є довговічною чергою),
+# визначає мову, сентимент і спам та записує результат назад.
+
+import asyncio
+import logging
+import os
+
+from services import nlp_service, spam_service
+from services.batching_service import MicroBatcher, BatcherOverloaded
+from services.nlp_service import detect_language_async, analyze_sentiment_batch, sentiment_cache
+from services.spam_service import detect_spam_batch, spam_cache
+from services.dedup_service import dedup_index, DEDUP_MODE
+from services.metrics_service import stage_timer
+from services.db_service import (
+    claim_pending_feedback,
+    release_feedback_claims,
+    update_feedback_classification,
+    get_feedback_classification,
+    mark_feedback_failed,
+)
+
+logger = logging.getLogger(__name__)
+
+CLASSIFY_BATCH = int(os.getenv("CLASSIFY_BATCH", "32"))
+CLASSIFY_POLL_SECONDS = float(os.getenv("CLASSIFY_POLL_SECONDS", "5"))
+# Скільки запис орендований воркером; має з запасом перевищувати час класифікації однієї пачки
+CLASSIFY_LEASE_SECONDS = int(os.getenv("CLASSIFY_LEASE_SECONDS", "300"))
+
+def warm_up_models():
+    # Функція рівня модуля, щоб її можна було передати і в пул процесів
+    nlp_service.warm_up()
+    spam_service.warm_up()
+
+def classify_texts_batch(texts: list[str]) -> list[dict]:
+    # Обидві моделі отримують увесь батч одним padded forward pass, а якщо їхні
+    # токенізатори збігаються — ще й спільні результати токенізації
+    memo = {}
+    sentiments = analyze_sentiment_batch(texts, memo)
+    spam_results = detect_spam_batch(texts, memo)
+    return [
+        {"sentiment": sentiment, "spam": spam, "spam_score": score}
+        for sentiment, (spam, score) in zip(sentiments, spam_results)
+    ]
+
+def classify_texts_sorted(texts: list[str], batch_size: int) -> list[dict]:
+    # Для великих обсягів (масове завантаження, перекласифікація): тексти сортуються за довжиною,
+    # щоб у кожному батчі моделі було мінімум паддингу; результати повертаються в порядку texts
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    results = [None] * len(texts)
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        for i, result in zip(idx, classify_texts_batch([texts[i] for i in idx])):
+            results[i] = result
+    return results
+
+def model_version() -> str:
+    # Ідентичність обох моделей (та сама, що в ключах кешу інференсу); зберігається у Feedback.model_version
+    return f"{sentiment_cache.model_id_fn()};{spam_cache.model_id_fn()}"
+
+classification_batcher = MicroBatcher("classification", classify_texts_batch)
+
+async def classify_texts(texts: list[str]) -> list[dict]:
+    sentiments = [sentiment_cache.get(t) for t in texts]
+    spam_results = [spam_cache.get(t) for t in texts]
+    if all(r is not None for r in sentiments + spam_results):
+        return [
+            {"sentiment": sentiment, "spam": spam, "spam_score": score}
+            for sentiment, (spam, score) in zip(sentiments, spam_results)
+        ]
+    # Тексти одного відгуку йдуть одним елементом черги, тож гарантовано потрапляють в один батч
+    return await classification_batcher.run_many(texts)
+
+async def classify_feedback(text: str, secret_text: str | None) -> dict:
+    texts = [text, secret_text] if secret_text else [text]
+    lang, results = await asyncio.gather(detect_language_async(text), classify_texts(texts))
+    main = results[0]
+    secret = results[1] if secret_text else {"sentiment": None, "spam": 0, "spam_score": 0.0}
+    return {
+        "lang": lang,
+        "sentiment": main["sentiment"],
+        "spam": main["spam"],
+        "secret_sentiment": secret["sentiment"],
+        "secret_spam": secret["spam"],
+        "secret_spam_score": secret["spam_score"],
+        "model_version": model_version(),
+    }
+
+def _check_duplicates(rows) -> list[int | None]:
+    # MinHash — чистий Python, тож рахується в потоці, а не в event loop; рядки йдуть по порядку id,
+    # щоб коренем кластера ставав найстаріший відгук
+    return [
+        dedup_index.check_and_add(institution_code, feedback_id, text)
+        for feedback_id, institution_code, text, _ in rows
+    ]
+
+class ClassificationWorker:
+    def __init__(self):
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def notify(self):
+        self._wakeup.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        if DEDUP_MODE != "off":
+            try:
+                await asyncio.to_thread(dedup_index.rebuild)
+            except Exception:
+                logger.exception("Не вдалося перебудувати індекс дублікатів")
+        # При старті підхоплюються pending-записи, що лишилися після перезапуску (неорендовані
+        # або з простроченою орендою). Кілька процесів застосунку не класифікують один запис двічі
+        backoff = 0.0
+        while True:
+            self._wakeup.clear()
+            try:
+                rows = await asyncio.to_thread(claim_pending_feedback, CLASSIFY_BATCH, CLASSIFY_LEASE_SECONDS)
+            except Exception:
+                logger.exception("Не вдалося завантажити pending-відгуки")
+                rows = []
+            if rows:
+                duplicates = [None] * len(rows)
+                if DEDUP_MODE != "off":
+                    try:
+                        duplicates = await asyncio.to_thread(_check_duplicates, rows)
+                    except Exception:
+                        logger.exception("Не вдалося перевірити дублікати")
+                # Усі записи паралельно, щоб їхні тексти потрапили в спільні батчі моделей
+                outcomes = await asyncio.gather(
+                    *(self._process(*row, duplicate_of) for row, duplicate_of in zip(rows, duplicates))
+                )
+                deferred = [row[0] for row, outcome in zip(rows, outcomes) if outcome == "deferred"]
+                if deferred:
+                    try:
+                        await asyncio.to_thread(release_feedback_claims, deferred)
+                    except Exception:
+                        logger.exception("Не вдалося зняти оренду з відкладених відгуків")
+                if "done" in outcomes:
+                    backoff = 0.0
+                    continue
+                # Жоден запис не записано (черга переповнена, БД недоступна) — не крутимо цикл впусту
+                backoff = min(max(backoff * 2, 0.5), CLASSIFY_POLL_SECONDS)
+                await asyncio.sleep(backoff)
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), CLASSIFY_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, feedback_id: int, institution_code: str, text: str, secret_text: str | None,
+                       duplicate_of: int | None = None) -> str:
+        # "done" — результат або статус failed записано; "deferred" — відкладено; "stuck" — не вдалося записати нічого
+        try:
+            original = None
+            if duplicate_of and DEDUP_MODE == "skip":
+                original = await asyncio.to_thread(get_feedback_classification, duplicate_of)
+            if original:
+                # Майже дублікат уже класифікованого відгуку: модель для основного тексту не запускаємо
+                lang, sentiment, spam, version = original
+                secret = (await classify_texts([secret_text]))[0] if secret_text else None
+                result = {
+                    "lang": lang,
+                    "sentiment": sentiment,
+                    "spam": spam,
+                    "secret_sentiment": secret["sentiment"] if secret else None,
+                    "secret_spam": secret["spam"] if secret else 0,
+                    "secret_spam_score": secret["spam_score"] if secret else 0.0,
+                    # Мітки скопійовано з оригіналу — версія теж його, інакше reclassify пропустив би
+                    # запис, оцінений старішою моделлю
+                    "model_version": version,
+                }
+            else:
+                # Від постановки в батчер до результату: очікування черги + мова + обидві моделі
+                with stage_timer("classification"):
+                    result = await classify_feedback(text, secret_text)
+            with stage_timer("db_update"):
+                await asyncio.to_thread(
+                    update_feedback_classification, feedback_id, duplicate_of=duplicate_of, **result
+                )
+            return "done"
+        except BatcherOverloaded:
+            # Відгук лишається pending і буде взятий наступним проходом воркера
+            logger.warning("Черга інференсу переповнена, відгук %s відкладено", feedback_id)
+            return "deferred"
+        except Exception:
+            logger.exception("Класифікація відгуку %s не вдалася", feedback_id)
+            try:
+                await asyncio.to_thread(mark_feedback_failed, feedback_id)
+                return "done"
+            except Exception:
+                # Оренда лишається: запис повернеться в роботу після CLASSIFY_LEASE_SECONDS
+                logger.exception("Не вдалося позначити відгук %s як failed", feedback_id)
+                return "stuck"
+
+classification_worker = ClassificationWorker()
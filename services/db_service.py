@@ -1,17 +1,88 @@
-import os, random, string
-from sqlalchemy import create_engine, Column, Integer, String, Text, Boolean, Float, func, ForeignKey
+import os, random, re, string
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, Boolean, Float, DateTime, SmallInteger, func, false, ForeignKey, Index, bindparam, inspect, insert, or_, select, text as sql_text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 
 # База даних
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///feedback.db")
+# Розмір пулу з'єднань (і для синхронного, і для асинхронного двигуна, див. async_db_service.py)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))
+
+def pool_options(url: str) -> dict:
+    # SQLite у пам'яті працює з одним з'єднанням на потік — там пул не налаштовується
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/").endswith("sqlite:")):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": not url.startswith("sqlite"),
+    }
+
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
+    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
+    **pool_options(DATABASE_URL)
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL").upper()
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+
+def sqlite_pragmas(dbapi_connection, _record):
+    # WAL: читачі не блокують запис і навпаки. synchronous=NORMAL у WAL не робить fsync на кожен
+    # коміт, база лишається цілісною (при втраті живлення можна втратити лише останні коміти).
+    # busy_timeout — писач чекає на блокування, а не падає одразу з "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+if engine.dialect.name == "sqlite":
+    if SQLITE_JOURNAL_MODE not in ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"):
+        raise ValueError(f"SQLITE_JOURNAL_MODE: невідоме значення {SQLITE_JOURNAL_MODE}")
+    if SQLITE_SYNCHRONOUS not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+        raise ValueError(f"SQLITE_SYNCHRONOUS: невідоме значення {SQLITE_SYNCHRONOUS}")
+    event.listen(engine, "connect", sqlite_pragmas)
+
 Base = declarative_base()
 
+def utcnow() -> datetime:
+    # Час у БД зберігається як UTC без tzinfo
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+# Статуси класифікації відгуку
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# Канонічний код сентименту для фільтрів і індексів (мітки моделі — у Feedback.sentiment)
+SENTIMENT_CODES = {
+    "very negative": 0,
+    "negative": 1,
+    "neutral": 2,
+    "positive": 3,
+    "very positive": 4,
+}
+
+def sentiment_code(sentiment):
+    return SENTIMENT_CODES.get(sentiment.lower()) if sentiment else None
+
 # Моделі
 class Institution(Base):
     __tablename__ = "institutions"
@@ -22,7 +93,7 @@ class Institution(Base):
 class Feedback(Base):
     __tablename__ = "feedbacks"
     id = Column(Integer, primary_key=True)
-    institution_code = Column(String, index=True)
+    institution_code = Column(String)
     subject = Column(String)
     text = Column(Text, nullable=False)
     secret_text = Column(Text)
@@ -33,7 +104,26 @@ class Feedback(Base):
     secret_sentiment = Column(String)
     secret_spam = Column(Boolean)
     secret_spam_score = Column(Float)
+    status = Column(String, default=STATUS_PENDING, index=True)
+    duplicate_of = Column(Integer, index=True)
+    created_at = Column(DateTime, default=utcnow, index=True)
+    # Похідні колонки заповнюються при записі, щоб фільтри адмінки не обчислювали length()/lower() для кожного рядка
+    text_length = Column(Integer)
+    sentiment_code = Column(SmallInteger)
+    # Які моделі поставили мітки (classification_service.model_version); NULL — класифіковано до появи колонки
+    model_version = Column(String)
+    # Оренда pending-запису фоновим воркером: поки claimed_until не минув, інші воркери (процеси uvicorn)
+    # його не беруть; після аварії воркера запис повертається в роботу, щойно оренда спливе
+    claimed_by = Column(String)
+    claimed_until = Column(DateTime)
     attachments = relationship("Attachment", back_populates="feedback", cascade="all, delete-orphan")
+    # Під комбінації фільтрів адмінки: рівність по префіксу + сортування за id без окремого кроку сортування
+    __table_args__ = (
+        Index("ix_feedbacks_institution_id", "institution_code", "id"),
+        Index("ix_feedbacks_institution_spam_id", "institution_code", "spam", "id"),
+        Index("ix_feedbacks_institution_sentiment_id", "institution_code", "sentiment_code", "id"),
+        Index("ix_feedbacks_institution_spam_sentiment_id", "institution_code", "spam", "sentiment_code", "id"),
+    )
 
 class Attachment(Base):
     __tablename__ = "attachments"
@@ -41,8 +131,23 @@ class Attachment(Base):
     feedback_id = Column(Integer, ForeignKey("feedbacks.id"), index=True)
     filename = Column(String, nullable=False)
     stored_path = Column(String, nullable=False)
+    # Адресація вмістом: однакові файли різних відгуків посилаються на один блоб
+    sha256 = Column(String, index=True)
+    size = Column(Integer)
+    content_type = Column(String)
     feedback = relationship("Feedback", back_populates="attachments")
 
+class FeedbackTag(Base):
+    # Нормалізовані теги: рядок на кожен тег відгуку. Feedback.tags лишається для показу,
+    # а фільтрація й фасети йдуть по складеному індексу (institution_code, tag, feedback_id)
+    __tablename__ = "feedback_tags"
+    feedback_id = Column(Integer, ForeignKey("feedbacks.id", ondelete="CASCADE"), primary_key=True)
+    tag = Column(String, primary_key=True)
+    institution_code = Column(String, nullable=False)
+    __table_args__ = (
+        Index("ix_feedback_tags_institution_tag_feedback", "institution_code", "tag", "feedback_id"),
+    )
+
 class Admin(Base):
     __tablename__ = "admin"
     id = Column(Integer, primary_key=True)
@@ -54,19 +159,169 @@ class AdminSecrets(Base):
     id = Column(Integer, primary_key=True)
     secret_view_password = Column(String, nullable=False)
 
-Base.metadata.create_all(bind=engine)
+class InferenceCacheEntry(Base):
+    __tablename__ = "inference_cache"
+    key = Column(String, primary_key=True)
+    cache_name = Column(String, nullable=False, index=True)
+    model_id = Column(String, nullable=False)
+    value = Column(Text, nullable=False)
+
+class FeedbackCounter(Base):
+    # Лічильники для /admin/stats, що оновлюються в тій самій транзакції, що й відгук:
+    # total, spam, ham, sentiment:<мітка>
+    __tablename__ = "feedback_counters"
+    institution_code = Column(String, primary_key=True)
+    counter = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class FeedbackRollup(Base):
+    # Погодинні й подобові агрегати для графіків динаміки: total, spam, ham, sentiment:<мітка>, lang:<мова>.
+    # Відгук рахується в інтервал свого created_at, навіть якщо класифікований пізніше
+    __tablename__ = "feedback_rollups"
+    institution_code = Column(String, primary_key=True)
+    granularity = Column(String, primary_key=True)  # hour | day
+    bucket_start = Column(DateTime, primary_key=True)
+    counter = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+
+class ReclassifyCheckpoint(Base):
+    # Прогрес перекласифікації під конкретну версію моделей: після переривання робота
+    # продовжується з last_id. Оновлюється в тій самій транзакції, що й результати пачки
+    __tablename__ = "reclassify_checkpoints"
+    model_version = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    changed = Column(Integer, nullable=False, default=0)
+    started_at = Column(DateTime, default=utcnow)
+    updated_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+# Прості міграції: create_all не додає нові колонки та індекси до вже існуючих таблиць.
+# Типи, що різняться між СУБД (DATETIME у SQLite — TIMESTAMP у PostgreSQL), задаються типом SQLAlchemy
+# і компілюються під діалект двигуна
+_COLUMN_MIGRATIONS = [
+    # Старі записи вже класифіковані синхронно
+    ("feedbacks", "status", f"VARCHAR DEFAULT '{STATUS_DONE}'"),
+    ("feedbacks", "duplicate_of", "INTEGER"),
+    ("attachments", "sha256", "VARCHAR"),
+    ("attachments", "size", "INTEGER"),
+    ("attachments", "content_type", "VARCHAR"),
+    # Для старих відгуків час подання невідомий — лишається NULL і в агрегати не потрапляє
+    ("feedbacks", "created_at", DateTime()),
+    ("feedbacks", "text_length", "INTEGER"),
+    ("feedbacks", "sentiment_code", "SMALLINT"),
+    ("feedbacks", "model_version", "VARCHAR"),
+    ("feedbacks", "claimed_by", "VARCHAR"),
+    ("feedbacks", "claimed_until", DateTime()),
+]
+
+# Заповнення нових колонок для існуючих рядків; виконується лише одразу після ALTER TABLE
+_sentiment_code_sql = " ".join(f"WHEN '{label}' THEN {code}" for label, code in SENTIMENT_CODES.items())
+_BACKFILL_MIGRATIONS = {
+    ("feedbacks", "text_length"): "UPDATE feedbacks SET text_length = length(text)",
+    ("feedbacks", "sentiment_code"): f"UPDATE feedbacks SET sentiment_code = CASE lower(sentiment) {_sentiment_code_sql} END",
+}
+
+# Індекси, що стали зайвими: ix_feedbacks_institution_code — префікс ix_feedbacks_institution_id,
+# але планувальник SQLite обирав його для сторінки без фільтрів, а на PostgreSQL він дає окреме сортування
+_DROPPED_INDEXES = ["ix_feedbacks_institution_code"]
+
+def migrate_schema():
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for name in _DROPPED_INDEXES:
+            conn.execute(sql_text(f"DROP INDEX IF EXISTS {name}"))
+        for table, column, ddl in _COLUMN_MIGRATIONS:
+            if not isinstance(ddl, str):
+                ddl = ddl.compile(dialect=engine.dialect)
+            existing = {c["name"] for c in insp.get_columns(table)}
+            if column not in existing:
+                conn.execute(sql_text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                if (table, column) in _BACKFILL_MIGRATIONS:
+                    conn.execute(sql_text(_BACKFILL_MIGRATIONS[(table, column)]))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+def init_db():
+    # Викликається при старті застосунку, а не під час імпорту модуля
+    insp = inspect(engine)
+    tags_table_is_new = not insp.has_table(FeedbackTag.__tablename__)
+    counters_table_is_new = not insp.has_table(FeedbackCounter.__tablename__)
+    Base.metadata.create_all(bind=engine)
+    migrate_schema()
+    if tags_table_is_new:
+        backfill_feedback_tags()
+    if counters_table_is_new:
+        reconcile_feedback_counters()
+    from services.search_service import init_search_index
+    init_search_index()
 
 # Функції доступу до БД
 def get_db():
+    # Сесія на запит (FastAPI Depends): функції з параметром db працюють у ній без власних комітів,
+    # а обробник комітить один раз — один unit of work і одне блокування запису SQLite на запит
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+@contextmanager
+def _session(db=None):
+    # Передана сесія (get_db, груповий коміт) — без коміту, його робить власник;
+    # інакше власна коротка сесія з комітом, як раніше
+    if db is not None:
+        yield db
+        return
     db = SessionLocal()
     try:
         yield db
+        db.commit()
     finally:
         db.close()
 
 def generate_random_code(length=8):
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
 
+def parse_tags(tags) -> list[str]:
+    # "a, b,,a" -> ["a", "b"]: без порожніх і повторів, порядок як у формі
+    if not tags:
+        return []
+    return list(dict.fromkeys(t.strip().lower() for t in tags.split(",") if t.strip()))
+
+def backfill_feedback_tags(batch_size=1000) -> int:
+    # Заповнює feedback_tags для відгуків, збережених до появи таблиці; повторний запуск безпечний
+    db = SessionLocal()
+    added = 0
+    try:
+        last_id = 0
+        while True:
+            rows = (
+                db.query(Feedback.id, Feedback.institution_code, Feedback.tags)
+                .filter(Feedback.id > last_id, Feedback.tags.isnot(None), Feedback.tags != "")
+                .order_by(Feedback.id)
+                .limit(batch_size)
+                .all()
+            )
+            if not rows:
+                return added
+            last_id = rows[-1].id
+            existing = {
+                (r.feedback_id, r.tag) for r in db.query(FeedbackTag.feedback_id, FeedbackTag.tag)
+                .filter(FeedbackTag.feedback_id.in_([r.id for r in rows]))
+            }
+            for r in rows:
+                for tag in parse_tags(r.tags):
+                    if (r.id, tag) not in existing:
+                        db.add(FeedbackTag(feedback_id=r.id, tag=tag, institution_code=r.institution_code))
+                        added += 1
+            db.commit()
+    finally:
+        db.close()
+
 def validate_institution_code(code: str) -> bool:
     return bool(code) and len(code) == 8 and all(c in string.ascii_lowercase + string.digits for c in code)
 
@@ -84,6 +339,57 @@ def add_institution(official_name):
         return code
     finally:
         db.close()
+        from services.institution_service import institution_registry
+        institution_registry.invalidate()
+
+def add_institutions_bulk(official_names: list[str], attempts: int = 3) -> list[tuple]:
+    # Масове створення: усі існуючі коди читаються одним запитом, нові генеруються з перевіркою
+    # по множині, усе вставляється однією транзакцією. Повертає [(id, official_name, code)] у порядку назв.
+    # Унікальний індекс на code ловить рідкісний збіг із паралельною вставкою — тоді пробуємо ще раз.
+    if not official_names:
+        return []
+    for attempt in range(attempts):
+        db = SessionLocal()
+        try:
+            taken = {code for (code,) in db.query(Institution.code)}
+            codes = []
+            for _ in official_names:
+                code = generate_random_code()
+                while code in taken:
+                    code = generate_random_code()
+                taken.add(code)
+                codes.append(code)
+            db.bulk_insert_mappings(Institution, [
+                {"official_name": name, "code": code} for name, code in zip(official_names, codes)
+            ])
+            db.flush()
+            ids = {}
+            for i in range(0, len(codes), 500):
+                ids.update(
+                    (r.code, r.id) for r in db.query(Institution.id, Institution.code)
+                    .filter(Institution.code.in_(codes[i:i + 500]))
+                )
+            db.commit()
+            break
+        except IntegrityError:
+            db.rollback()
+            if attempt == attempts - 1:
+                raise
+        finally:
+            db.close()
+    from services.institution_service import institution_registry
+    institution_registry.invalidate()
+    return [(ids.get(code), name, code) for name, code in zip(official_names, codes)]
+
+def get_institutions_by_id_range(first_id: int, last_id: int, db=None):
+    with _session(db) as db:
+        rows = (
+            db.query(Institution.id, Institution.official_name, Institution.code)
+            .filter(Institution.id >= first_id, Institution.id <= last_id)
+            .order_by(Institution.id)
+            .all()
+        )
+        return [(r.id, r.official_name, r.code) for r in rows]
 
 def get_all_institutions():
     db = SessionLocal()
@@ -92,29 +398,82 @@ def get_all_institutions():
     finally:
         db.close()
 
-def get_institution_by_code(code):
+def get_institutions_version():
+    # Інституції лише додаються, тож max(id) змінюється при кожній зміні списку (і береться з первинного ключа)
     db = SessionLocal()
     try:
-        inst = db.query(Institution).filter_by(code=code).first()
-        return (inst.official_name, inst.code) if inst else None
+        return db.query(func.max(Institution.id)).scalar() or 0
     finally:
         db.close()
 
+def get_institution_by_code(code, db=None):
+    with _session(db) as db:
+        inst = db.query(Institution).filter_by(code=code).first()
+        return (inst.official_name, inst.code) if inst else None
+
+def _classification_counters(sentiment, spam) -> dict:
+    counters = {}
+    if spam is not None:
+        counters["spam" if spam else "ham"] = 1
+    if sentiment:
+        counters[f"sentiment:{sentiment.lower()}"] = 1
+    return counters
+
+def _upsert_increment(db, model, rows: list[dict]):
+    # Атомарний інкремент через INSERT ... ON CONFLICT DO UPDATE (SQLite >= 3.24, PostgreSQL)
+    if not rows:
+        return
+    insert = pg_insert if engine.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[c for c in model.__table__.primary_key.columns],
+        set_={"value": model.value + stmt.excluded.value},
+    )
+    db.execute(stmt)
+
+def rollup_bucket(created_at: datetime, granularity: str) -> datetime:
+    if granularity == "day":
+        return created_at.replace(hour=0, minute=0, second=0, microsecond=0)
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+def _bump_counters(db, institution_code, counters: dict, created_at=None, lang=None):
+    _upsert_increment(db, FeedbackCounter, [
+        {"institution_code": institution_code, "counter": name, "value": delta}
+        for name, delta in counters.items()
+    ])
+    if created_at is None:
+        return
+    rollup = dict(counters)
+    if lang:
+        rollup[f"lang:{lang}"] = 1
+    _upsert_increment(db, FeedbackRollup, [
+        {
+            "institution_code": institution_code,
+            "granularity": granularity,
+            "bucket_start": rollup_bucket(created_at, granularity),
+            "counter": name,
+            "value": delta,
+        }
+        for granularity in ROLLUP_GRANULARITIES
+        for name, delta in rollup.items()
+    ])
+
 def save_feedback_for_institution(
     institution_code,
     text,
-    lang,
-    sentiment,
-    spam,
+    lang=None,
+    sentiment=None,
+    spam=None,
     tags=None,
     subject=None,
     secret_text=None,
     secret_sentiment=None,
     secret_spam=None,
-    secret_spam_score=None
+    secret_spam_score=None,
+    status=STATUS_PENDING,
+    db=None
 ):
-    db = SessionLocal()
-    try:
+    with _session(db) as db:
         feedback = Feedback(
             institution_code=institution_code,
             subject=subject,
@@ -126,109 +485,693 @@ def save_feedback_for_institution(
             tags=tags,
             secret_sentiment=secret_sentiment,
             secret_spam=secret_spam,
-            secret_spam_score=secret_spam_score
+            secret_spam_score=secret_spam_score,
+            status=status,
+            created_at=utcnow(),
+            text_length=len(text),
+            sentiment_code=sentiment_code(sentiment)
         )
         db.add(feedback)
-        db.commit()
-        db.refresh(feedback)
+        # id відомий після flush — без повторного читання рядка після коміту
+        db.flush()
+        for tag in parse_tags(tags):
+            db.add(FeedbackTag(feedback_id=feedback.id, tag=tag, institution_code=institution_code))
+        _bump_counters(
+            db, institution_code, {"total": 1, **_classification_counters(sentiment, spam)},
+            created_at=feedback.created_at, lang=lang
+        )
+        db.flush()
         return feedback.id
+
+def save_feedback_bulk(institution_code, items: list[dict]) -> list[int]:
+    # Пачка вже класифікованих відгуків однією транзакцією: executemany з RETURNING для id,
+    # теги й лічильники — теж пакетно. items: text, subject, tags, secret_text, lang, sentiment,
+    # spam, secret_sentiment, secret_spam, secret_spam_score, created_at (необов'язково).
+    # Повертає id у порядку items.
+    if not items:
+        return []
+    now = utcnow()
+    rows = [
+        {
+            "institution_code": institution_code,
+            "subject": item.get("subject"),
+            "text": item["text"],
+            "secret_text": item.get("secret_text"),
+            "lang": item.get("lang"),
+            "sentiment": item.get("sentiment"),
+            "spam": item.get("spam"),
+            "tags": item.get("tags"),
+            "secret_sentiment": item.get("secret_sentiment"),
+            "secret_spam": item.get("secret_spam"),
+            "secret_spam_score": item.get("secret_spam_score"),
+            "status": STATUS_DONE,
+            "created_at": item.get("created_at") or now,
+            "text_length": len(item["text"]),
+            "sentiment_code": sentiment_code(item.get("sentiment")),
+            "model_version": item.get("model_version"),
+        }
+        for item in items
+    ]
+    db = SessionLocal()
+    try:
+        ids = list(db.scalars(
+            insert(Feedback).returning(Feedback.id, sort_by_parameter_order=True), rows
+        ))
+        tag_rows = [
+            {"feedback_id": fid, "tag": tag, "institution_code": institution_code}
+            for fid, row in zip(ids, rows) for tag in parse_tags(row["tags"])
+        ]
+        if tag_rows:
+            db.execute(insert(FeedbackTag), tag_rows)
+
+        counters, rollups = {}, {}
+        for row in rows:
+            bumped = {"total": 1, **_classification_counters(row["sentiment"], row["spam"])}
+            for name in bumped:
+                counters[name] = counters.get(name, 0) + 1
+            if row["lang"]:
+                bumped[f"lang:{row['lang']}"] = 1
+            for granularity in ROLLUP_GRANULARITIES:
+                bucket = rollup_bucket(row["created_at"], granularity)
+                for name in bumped:
+                    key = (granularity, bucket, name)
+                    rollups[key] = rollups.get(key, 0) + 1
+        _upsert_increment(db, FeedbackCounter, [
+            {"institution_code": institution_code, "counter": name, "value": value}
+            for name, value in counters.items()
+        ])
+        _upsert_increment(db, FeedbackRollup, [
+            {"institution_code": institution_code, "granularity": g, "bucket_start": b, "counter": name, "value": value}
+            for (g, b, name), value in rollups.items()
+        ])
+        db.commit()
+        return ids
     finally:
         db.close()
 
-def save_attachments(feedback_id: int, attachments):
+def set_duplicate_of(pairs: list[tuple]):
+    # [(feedback_id, duplicate_of)] одним executemany
+    if not pairs:
+        return
     db = SessionLocal()
     try:
-        for filename, stored_path in attachments:
-            att = Attachment(feedback_id=feedback_id, filename=filename, stored_path=stored_path)
-            db.add(att)
+        db.execute(
+            sql_text("UPDATE feedbacks SET duplicate_of = :dup WHERE id = :id"),
+            [{"id": fid, "dup": dup} for fid, dup in pairs]
+        )
         db.commit()
     finally:
         db.close()
 
-def get_attachments_for_feedback(feedback_id: int):
+def claim_pending_feedback(limit=32, lease_seconds=300):
+    # Забирає до limit pending-записів, не орендованих іншим воркером, і орендує їх на lease_seconds.
+    # Умова на оренду перевіряється в самому UPDATE, тож один запис отримує лише один воркер
+    token = uuid4().hex
+    now = utcnow()
+    free = (Feedback.status == STATUS_PENDING) & or_(
+        Feedback.claimed_until.is_(None), Feedback.claimed_until < now
+    )
     db = SessionLocal()
     try:
-        atts = db.query(Attachment).filter_by(feedback_id=feedback_id).all()
-        return [(a.filename, a.stored_path) for a in atts]
+        ids = select(Feedback.id).where(free).order_by(Feedback.id).limit(limit).scalar_subquery()
+        db.query(Feedback).filter(Feedback.id.in_(ids), free).update({
+            Feedback.claimed_by: token,
+            Feedback.claimed_until: now + timedelta(seconds=lease_seconds),
+        }, synchronize_session=False)
+        db.commit()
+        rows = (
+            db.query(Feedback.id, Feedback.institution_code, Feedback.text, Feedback.secret_text)
+            .filter(Feedback.claimed_by == token, Feedback.status == STATUS_PENDING)
+            .order_by(Feedback.id)
+            .all()
+        )
+        return [(r.id, r.institution_code, r.text, r.secret_text) for r in rows]
     finally:
         db.close()
 
-def load_all_feedback_for_institution(
+def release_feedback_claims(feedback_ids: list[int]):
+    # Відкладені записи (переповнена черга інференсу) знову доступні всім воркерам
+    if not feedback_ids:
+        return
+    db = SessionLocal()
+    try:
+        db.query(Feedback).filter(
+            Feedback.id.in_(feedback_ids), Feedback.status == STATUS_PENDING
+        ).update({Feedback.claimed_by: None, Feedback.claimed_until: None}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def update_feedback_classification(
+    feedback_id: int,
+    lang,
+    sentiment,
+    spam,
+    secret_sentiment=None,
+    secret_spam=None,
+    secret_spam_score=None,
+    duplicate_of=None,
+    model_version=None
+):
+    db = SessionLocal()
+    try:
+        # Умова на статус: якщо запис уже обробив інший воркер, повторно не пишемо
+        updated = db.query(Feedback).filter(
+            Feedback.id == feedback_id,
+            Feedback.status == STATUS_PENDING
+        ).update({
+            Feedback.lang: lang,
+            Feedback.sentiment: sentiment,
+            Feedback.sentiment_code: sentiment_code(sentiment),
+            Feedback.spam: spam,
+            Feedback.secret_sentiment: secret_sentiment,
+            Feedback.secret_spam: secret_spam,
+            Feedback.secret_spam_score: secret_spam_score,
+            Feedback.duplicate_of: duplicate_of,
+            Feedback.model_version: model_version,
+            Feedback.status: STATUS_DONE,
+        }, synchronize_session=False)
+        if updated:
+            f = db.query(Feedback.institution_code, Feedback.created_at).filter(Feedback.id == feedback_id).one()
+            _bump_counters(
+                db, f.institution_code, _classification_counters(sentiment, spam),
+                created_at=f.created_at, lang=lang
+            )
+        db.commit()
+    finally:
+        db.close()
+
+def get_reclassify_checkpoint(model_version: str, restart: bool = False) -> dict:
+    # Повертає прогрес перекласифікації (створює запис при першому запуску); restart — почати з нуля
+    db = SessionLocal()
+    try:
+        checkpoint = db.get(ReclassifyCheckpoint, model_version)
+        if checkpoint is None or restart:
+            checkpoint = db.merge(ReclassifyCheckpoint(
+                model_version=model_version, last_id=0, processed=0, changed=0,
+                started_at=utcnow(), updated_at=None, finished_at=None
+            ))
+            db.commit()
+        return {
+            "model_version": checkpoint.model_version,
+            "last_id": checkpoint.last_id,
+            "processed": checkpoint.processed,
+            "changed": checkpoint.changed,
+            "started_at": checkpoint.started_at,
+            "finished_at": checkpoint.finished_at,
+        }
+    finally:
+        db.close()
+
+def load_feedback_for_reclassify(model_version: str, after_id: int, limit: int) -> list[tuple]:
+    # Класифіковані відгуки з іншою (або невідомою) версією моделей, по id; pending обробляє воркер
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Feedback.id, Feedback.text, Feedback.secret_text)
+            .filter(
+                Feedback.id > after_id,
+                Feedback.status == STATUS_DONE,
+                or_(Feedback.model_version.is_(None), Feedback.model_version != model_version),
+            )
+            .order_by(Feedback.id)
+            .limit(limit)
+            .all()
+        )
+        return [(r.id, r.text, r.secret_text) for r in rows]
+    finally:
+        db.close()
+
+def apply_reclassification(model_version: str, results: list[dict], last_id: int) -> int:
+    # Нові мітки пачки, поправки лічильників/агрегатів і checkpoint — однією короткою транзакцією,
+    # тож застосунок може приймати відгуки паралельно. Повертає кількість відгуків зі зміненими мітками
+    db = SessionLocal()
+    try:
+        ids = [r["id"] for r in results]
+        old = {
+            r.id: r for r in db.query(
+                Feedback.id, Feedback.institution_code, Feedback.created_at, Feedback.sentiment, Feedback.spam
+            ).filter(Feedback.id.in_(ids), Feedback.status == STATUS_DONE).with_for_update()
+        }
+        updates, counters, rollups = [], {}, {}
+        changed = 0
+        for r in results:
+            prev = old.get(r["id"])
+            if prev is None:
+                continue
+            updates.append({
+                "b_id": r["id"],
+                "sentiment": r["sentiment"],
+                "sentiment_code": sentiment_code(r["sentiment"]),
+                "spam": bool(r["spam"]),
+                "secret_sentiment": r["secret_sentiment"],
+                "secret_spam": bool(r["secret_spam"]) if r["secret_spam"] is not None else None,
+                "secret_spam_score": r["secret_spam_score"],
+                "model_version": model_version,
+            })
+            delta = {}
+            for name in _classification_counters(prev.sentiment, prev.spam):
+                delta[name] = delta.get(name, 0) - 1
+            for name in _classification_counters(r["sentiment"], r["spam"]):
+                delta[name] = delta.get(name, 0) + 1
+            delta = {name: d for name, d in delta.items() if d}
+            if not delta:
+                continue
+            changed += 1
+            for name, d in delta.items():
+                key = (prev.institution_code, name)
+                counters[key] = counters.get(key, 0) + d
+                if prev.created_at is None:
+                    continue
+                for granularity in ROLLUP_GRANULARITIES:
+                    key = (prev.institution_code, granularity, rollup_bucket(prev.created_at, granularity), name)
+                    rollups[key] = rollups.get(key, 0) + d
+        if updates:
+            table = Feedback.__table__
+            db.execute(
+                table.update().where(table.c.id == bindparam("b_id")).values({
+                    name: bindparam(name) for name in updates[0] if name != "b_id"
+                }),
+                updates
+            )
+        _upsert_increment(db, FeedbackCounter, [
+            {"institution_code": code, "counter": name, "value": d}
+            for (code, name), d in counters.items() if d
+        ])
+        _upsert_increment(db, FeedbackRollup, [
+            {"institution_code": code, "granularity": g, "bucket_start": b, "counter": name, "value": d}
+            for (code, g, b, name), d in rollups.items() if d
+        ])
+        checkpoint = db.get(ReclassifyCheckpoint, model_version)
+        checkpoint.last_id = max(checkpoint.last_id, last_id)
+        checkpoint.processed += len(updates)
+        checkpoint.changed += changed
+        checkpoint.updated_at = utcnow()
+        db.commit()
+        return changed
+    finally:
+        db.close()
+
+def finish_reclassify_checkpoint(model_version: str):
+    db = SessionLocal()
+    try:
+        db.query(ReclassifyCheckpoint).filter(ReclassifyCheckpoint.model_version == model_version).update(
+            {ReclassifyCheckpoint.finished_at: utcnow()}, synchronize_session=False
+        )
+        db.commit()
+    finally:
+        db.close()
+
+def get_model_version_counts() -> list[tuple]:
+    # (версія моделей, кількість класифікованих відгуків) — скільки ще лишилося перекласифікувати
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Feedback.model_version, func.count(Feedback.id))
+            .filter(Feedback.status == STATUS_DONE)
+            .group_by(Feedback.model_version)
+            .order_by(func.count(Feedback.id).desc())
+            .all()
+        )
+        return [(version, n) for version, n in rows]
+    finally:
+        db.close()
+
+def get_feedback_classification(feedback_id: int):
+    db = SessionLocal()
+    try:
+        f = db.query(
+            Feedback.lang, Feedback.sentiment, Feedback.spam, Feedback.model_version, Feedback.status
+        ).filter(Feedback.id == feedback_id).first()
+        if f and f.status == STATUS_DONE:
+            return f.lang, f.sentiment, f.spam, f.model_version
+        return None
+    finally:
+        db.close()
+
+def load_recent_feedback_for_dedup(limit_per_institution: int):
+    db = SessionLocal()
+    try:
+        rn = func.row_number().over(
+            partition_by=Feedback.institution_code, order_by=Feedback.id.desc()
+        ).label("rn")
+        sub = (
+            db.query(Feedback.id, Feedback.institution_code, Feedback.text, Feedback.duplicate_of, rn)
+            .filter(Feedback.status != STATUS_PENDING)
+            .subquery()
+        )
+        rows = (
+            db.query(sub.c.id, sub.c.institution_code, sub.c.text, sub.c.duplicate_of)
+            .filter(sub.c.rn <= limit_per_institution)
+            .order_by(sub.c.id)
+            .all()
+        )
+        return [(r.id, r.institution_code, r.text, r.duplicate_of) for r in rows]
+    finally:
+        db.close()
+
+def get_duplicate_clusters(institution_code: str, limit=50, db=None):
+    with _session(db) as db:
+        clusters = (
+            db.query(Feedback.duplicate_of, func.count(Feedback.id).label("copies"))
+            .filter(Feedback.institution_code == institution_code, Feedback.duplicate_of.isnot(None))
+            .group_by(Feedback.duplicate_of)
+            .order_by(func.count(Feedback.id).desc())
+            .limit(limit)
+            .all()
+        )
+        roots = {c.duplicate_of: c.copies for c in clusters}
+        if not roots:
+            return []
+        originals = {
+            f.id: f for f in db.query(Feedback.id, Feedback.subject, Feedback.text)
+            .filter(Feedback.id.in_(roots))
+        }
+        members = {}
+        for r in (
+            db.query(Feedback.id, Feedback.duplicate_of)
+            .filter(Feedback.duplicate_of.in_(roots))
+            .order_by(Feedback.id.desc())
+        ):
+            members.setdefault(r.duplicate_of, []).append(r.id)
+        result = []
+        for root_id, copies in roots.items():
+            original = originals.get(root_id)
+            result.append((
+                root_id,
+                original.subject if original else None,
+                original.text if original else None,
+                copies,
+                members.get(root_id, [])[:20],
+            ))
+        return result
+
+def mark_feedback_failed(feedback_id: int):
+    db = SessionLocal()
+    try:
+        db.query(Feedback).filter(
+            Feedback.id == feedback_id,
+            Feedback.status == STATUS_PENDING
+        ).update({Feedback.status: STATUS_FAILED}, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def save_attachments(feedback_id: int, attachments, db=None):
+    with _session(db) as db:
+        for filename, stored_path, sha256, size, content_type in attachments:
+            att = Attachment(
+                feedback_id=feedback_id,
+                filename=filename,
+                stored_path=stored_path,
+                sha256=sha256,
+                size=size,
+                content_type=content_type
+            )
+            db.add(att)
+        db.flush()
+
+def get_attachments_for_feedback(feedback_id: int, db=None):
+    with _session(db) as db:
+        atts = db.query(Attachment).filter_by(feedback_id=feedback_id).order_by(Attachment.id).all()
+        return [(a.id, a.filename, a.size) for a in atts]
+
+def get_attachment(attachment_id: int, db=None):
+    with _session(db) as db:
+        a = db.query(Attachment).filter_by(id=attachment_id).first()
+        return (a.filename, a.stored_path, a.sha256, a.content_type) if a else None
+
+def get_referenced_attachment_hashes() -> set:
+    db = SessionLocal()
+    try:
+        rows = db.query(Attachment.sha256).filter(Attachment.sha256.isnot(None)).distinct()
+        return {r.sha256 for r in rows}
+    finally:
+        db.close()
+
+FEEDBACK_PAGE_SIZE = 50
+
+def _filter_feedback_query(
+    query,
     institution_code,
     spam_filter='all',
     sentiment_filter='all',
     length_filter='all',
-    order='desc',
-    tags_filter='all'
+    tags_filter='all',
+    tags_mode='any'
 ):
-    db = SessionLocal()
-    try:
-        query = db.query(Feedback).filter(Feedback.institution_code == institution_code)
+    query = query.filter(Feedback.institution_code == institution_code)
 
-        # Фільтр спаму
-        if spam_filter == 'spam':
-            query = query.filter(Feedback.spam == True)
-        elif spam_filter == 'ham':
-            query = query.filter(Feedback.spam == False)
+    # Фільтр спаму
+    if spam_filter == 'spam':
+        query = query.filter(Feedback.spam == True)
+    elif spam_filter == 'ham':
+        query = query.filter(Feedback.spam == False)
 
-        # Фільтр сентименту (нечутливий до регістру)
-        if sentiment_filter.lower() != 'all':
-            query = query.filter(func.lower(Feedback.sentiment) == sentiment_filter.lower())
+    # Фільтр сентименту (нечутливий до регістру)
+    if sentiment_filter.lower() != 'all':
+        code = sentiment_code(sentiment_filter)
+        query = query.filter(Feedback.sentiment_code == code if code is not None else false())
 
-        # Фільтр довжини
-        if length_filter == 'short':
-            query = query.filter(Feedback.text.op('length')() <= 100)
-        elif length_filter == 'long':
-            query = query.filter(Feedback.text.op('length')() > 100)
+    # Фільтр довжини
+    if length_filter == 'short':
+        query = query.filter(Feedback.text_length <= 100)
+    elif length_filter == 'long':
+        query = query.filter(Feedback.text_length > 100)
 
-        # Фільтр тегів
-        if tags_filter != 'all':
-            query = query.filter(Feedback.tags.like(f"%{tags_filter}%"))
+    # Фільтр тегів: точний збіг через feedback_tags; кілька тегів через кому —
+    # будь-який із них (tags_mode='any') або всі одразу (tags_mode='all')
+    tags = parse_tags(tags_filter) if tags_filter != 'all' else []
+    if tags:
+        tagged = select(FeedbackTag.feedback_id).where(
+            FeedbackTag.institution_code == institution_code,
+            FeedbackTag.tag.in_(tags)
+        )
+        if tags_mode == 'all' and len(tags) > 1:
+            tagged = tagged.group_by(FeedbackTag.feedback_id).having(
+                func.count(FeedbackTag.tag) == len(tags)
+            )
+        query = query.filter(Feedback.id.in_(tagged))
 
-        # Сортування
+    return query
+
+def _feedback_row(f, attachments):
+    return (
+        f.id,
+        f.subject,
+        f.text,
+        f.secret_text,
+        f.lang,
+        f.sentiment,
+        f.spam,
+        f.tags,
+        f.secret_sentiment,
+        f.secret_spam,
+        f.secret_spam_score,
+        attachments,
+        f.status,
+        f.duplicate_of,
+    )
+
+def _load_attachments_by_feedback(db, feedback_ids):
+    # Один запит на всю сторінку замість лінивого завантаження f.attachments для кожного рядка
+    result = {fid: [] for fid in feedback_ids}
+    for i in range(0, len(feedback_ids), 500):
+        rows = (
+            db.query(Attachment.feedback_id, Attachment.filename, Attachment.stored_path)
+            .filter(Attachment.feedback_id.in_(feedback_ids[i:i + 500]))
+            .order_by(Attachment.id)
+        )
+        for r in rows:
+            result[r.feedback_id].append((r.filename, r.stored_path))
+    return result
+
+_PLAN_INDEX_RE = re.compile(r"(?:USING (?:COVERING )?INDEX|Index (?:Only )?Scan(?: Backward)? using) (\w+)")
+
+def expected_feedback_index(filters: dict) -> str:
+    # Складений індекс (Feedback.__table_args__) під комбінацію фільтрів; фільтр довжини індексом не покривається
+    parts = ["institution"]
+    if filters["spam"] != "all":
+        parts.append("spam")
+    if filters["sentiment"] != "all":
+        parts.append("sentiment")
+    return "ix_feedbacks_" + "_".join(parts) + "_id"
+
+def explain_feedback_filters(institution_code="aaaaaaaa") -> list[tuple]:
+    # План запиту сторінки адмінки для кожної комбінації фільтрів спаму/сентименту/довжини.
+    # Повертає (фільтри, індекс або None, текст плану); використовується командою check-indexes
+    dialect = engine.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        raise RuntimeError(f"EXPLAIN не підтримується для {dialect}")
+    results = []
+    db = SessionLocal()
+    try:
+        for spam_filter in ("all", "spam", "ham"):
+            for sentiment_filter in ("all", "negative"):
+                for length_filter in ("all", "short"):
+                    query = _filter_feedback_query(
+                        db.query(Feedback), institution_code, spam_filter, sentiment_filter, length_filter
+                    ).order_by(Feedback.id.desc()).limit(FEEDBACK_PAGE_SIZE + 1)
+                    sql = str(query.statement.compile(engine, compile_kwargs={"literal_binds": True}))
+                    if dialect == "sqlite":
+                        rows = db.execute(sql_text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+                        plan = "\n".join(r[-1] for r in rows)
+                    else:
+                        plan = "\n".join(r[0] for r in db.execute(sql_text(f"EXPLAIN {sql}")))
+                    match = _PLAN_INDEX_RE.search(plan)
+                    results.append((
+                        {"spam": spam_filter, "sentiment": sentiment_filter, "length": length_filter},
+                        match.group(1) if match else None,
+                        plan,
+                    ))
+        return results
+    finally:
+        db.close()
+
+def load_feedback_page(
+    institution_code,
+    spam_filter='all',
+    sentiment_filter='all',
+    length_filter='all',
+    order='desc',
+    tags_filter='all',
+    tags_mode='any',
+    cursor=None,
+    limit=FEEDBACK_PAGE_SIZE,
+    db=None
+):
+    # Keyset-пагінація по Feedback.id: cursor — id останнього рядка попередньої сторінки.
+    # Повертає (рядки, наступний cursor або None, якщо це остання сторінка).
+    with _session(db) as db:
+        query = _filter_feedback_query(
+            db.query(Feedback), institution_code,
+            spam_filter, sentiment_filter, length_filter, tags_filter, tags_mode
+        )
         if order == 'asc':
+            if cursor is not None:
+                query = query.filter(Feedback.id > cursor)
             query = query.order_by(Feedback.id.asc())
         else:
+            if cursor is not None:
+                query = query.filter(Feedback.id < cursor)
             query = query.order_by(Feedback.id.desc())
 
-        results = query.all()
-        return [
-            (
-                f.id,
-                f.subject,
-                f.text,
-                f.secret_text,
-                f.lang,
-                f.sentiment,
-                f.spam,
-                f.tags,
-                f.secret_sentiment,
-                f.secret_spam,
-                f.secret_spam_score,
-                [(a.filename, a.stored_path) for a in f.attachments],
-            )
-            for f in results
-        ]
-    finally:
-        db.close()
+        results = query.limit(limit + 1).all()
+        has_more = len(results) > limit
+        results = results[:limit]
+        attachments = _load_attachments_by_feedback(db, [f.id for f in results])
+        rows = [_feedback_row(f, attachments[f.id]) for f in results]
+        return rows, (results[-1].id if has_more else None)
+
+EXPORT_FIELDS = [
+    "id", "created_at", "subject", "text", "lang", "sentiment", "spam", "tags",
+    "status", "duplicate_of", "attachments",
+]
+EXPORT_SECRET_FIELDS = ["secret_text", "secret_sentiment", "secret_spam", "secret_spam_score"]
 
-def get_feedback_secret_text_by_id_and_code(feedback_id: int, institution_code: str):
+def iter_feedback_for_export(
+    institution_code,
+    spam_filter='all',
+    sentiment_filter='all',
+    length_filter='all',
+    tags_filter='all',
+    tags_mode='any',
+    include_secret=False,
+    batch_size=500
+):
+    # Потокове читання для експорту: рядки йдуть пачками по batch_size через серверний курсор
+    # (yield_per), тож пам'ять не залежить від кількості відгуків. Повертає генератор словників.
+    columns = [
+        Feedback.id, Feedback.created_at, Feedback.subject, Feedback.text, Feedback.lang,
+        Feedback.sentiment, Feedback.spam, Feedback.tags, Feedback.status, Feedback.duplicate_of,
+    ]
+    if include_secret:
+        columns += [Feedback.secret_text, Feedback.secret_sentiment, Feedback.secret_spam, Feedback.secret_spam_score]
     db = SessionLocal()
     try:
-        f = db.query(Feedback).filter_by(id=feedback_id, institution_code=institution_code).first()
-        return f.secret_text if f else None
+        query = _filter_feedback_query(
+            db.query(*columns), institution_code,
+            spam_filter, sentiment_filter, length_filter, tags_filter, tags_mode
+        ).order_by(Feedback.id).execution_options(yield_per=batch_size)
+        batch = []
+        for row in query:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield from _export_batch(batch, include_secret)
+                batch = []
+        yield from _export_batch(batch, include_secret)
     finally:
         db.close()
 
-def get_feedback_secret_meta_by_id_and_code(feedback_id: int, institution_code: str):
+def _export_batch(rows, include_secret):
+    if not rows:
+        return
+    # Кількість вкладень — одним запитом на пачку, в окремій сесії, щоб не заважати відкритому курсору
     db = SessionLocal()
     try:
+        counts = dict(
+            db.query(Attachment.feedback_id, func.count(Attachment.id))
+            .filter(Attachment.feedback_id.in_([r.id for r in rows]))
+            .group_by(Attachment.feedback_id)
+            .all()
+        )
+    finally:
+        db.close()
+    for r in rows:
+        item = {
+            "id": r.id,
+            "created_at": r.created_at.isoformat() + "Z" if r.created_at else None,
+            "subject": r.subject,
+            "text": r.text,
+            "lang": r.lang,
+            "sentiment": r.sentiment,
+            "spam": r.spam,
+            "tags": r.tags,
+            "status": r.status,
+            "duplicate_of": r.duplicate_of,
+            "attachments": counts.get(r.id, 0),
+        }
+        if include_secret:
+            item.update({name: getattr(r, name) for name in EXPORT_SECRET_FIELDS})
+        yield item
+
+def load_all_feedback_for_institution(
+    institution_code,
+    spam_filter='all',
+    sentiment_filter='all',
+    length_filter='all',
+    order='desc',
+    tags_filter='all',
+    tags_mode='any',
+    db=None
+):
+    with _session(db) as db:
+        query = _filter_feedback_query(
+            db.query(Feedback), institution_code,
+            spam_filter, sentiment_filter, length_filter, tags_filter, tags_mode
+        )
+
+        # Сортування
+        if order == 'asc':
+            query = query.order_by(Feedback.id.asc())
+        else:
+            query = query.order_by(Feedback.id.desc())
+
+        results = query.all()
+        attachments = _load_attachments_by_feedback(db, [f.id for f in results])
+        return [_feedback_row(f, attachments[f.id]) for f in results]
+
+def get_feedback_secret_text_by_id_and_code(feedback_id: int, institution_code: str, db=None):
+    with _session(db) as db:
+        f = db.query(Feedback).filter_by(id=feedback_id, institution_code=institution_code).first()
+        return f.secret_text if f else None
+
+def get_feedback_secret_meta_by_id_and_code(feedback_id: int, institution_code: str, db=None):
+    with _session(db) as db:
         f = db.query(Feedback).filter_by(id=feedback_id, institution_code=institution_code).first()
         if f:
             return f.secret_sentiment, f.secret_spam, f.secret_spam_score
         return None, None, None
-    finally:
-        db.close()
 
 def create_admin_table_if_not_exists():
     Base.metadata.create_all(bind=engine)
@@ -253,7 +1196,18 @@ def verify_admin_user(username, password):
     finally:
         db.close()
 
+def get_admin_password_hash(username):
+    # Дешевий запит за унікальним username: ключ кешу перевірених паролів (auth_service) містить хеш,
+    # тож зміна пароля в будь-якому воркері одразу робить старі записи кешу непридатними
+    db = SessionLocal()
+    try:
+        row = db.query(Admin.password_hash).filter_by(username=username).first()
+        return row.password_hash if row else None
+    finally:
+        db.close()
+
 def update_admin_password(username, new_password_hash):
+    from services.auth_service import invalidate_credentials_cache
     db = SessionLocal()
     try:
         admin = db.query(Admin).filter_by(username=username).first()
@@ -262,6 +1216,7 @@ def update_admin_password(username, new_password_hash):
             db.commit()
     finally:
         db.close()
+        invalidate_credentials_cache(username)
 
 def set_secret_view_password(password: str):
     db = SessionLocal()
@@ -272,60 +1227,177 @@ def set_secret_view_password(password: str):
     finally:
         db.close()
 
-def get_secret_view_password() -> str:
-    db = SessionLocal()
-    try:
+def get_secret_view_password(db=None) -> str:
+    with _session(db) as db:
         s = db.query(AdminSecrets).filter_by(id=1).first()
         return s.secret_view_password if s else ""
-    finally:
-        db.close()
 
 def generate_random_password(length=24):
     chars = string.ascii_letters + string.digits
     return ''.join(random.choice(chars) for _ in range(length))
 
-def get_feedback_stats(code: str, metric: str = "sentiment") -> dict:
+def load_cached_inference(keys) -> dict:
     db = SessionLocal()
     try:
-        if metric == "spam":
-            spam_count = db.query(func.count(Feedback.id)).filter_by(
-                institution_code=code, spam=True
-            ).scalar() or 0
-            ham_count = db.query(func.count(Feedback.id)).filter_by(
-                institution_code=code, spam=False
-            ).scalar() or 0
-            return {
-                "metric": "spam",
-                "total": spam_count + ham_count,
-                "data": {"spam": spam_count, "ham": ham_count},
-            }
+        rows = db.query(InferenceCacheEntry.key, InferenceCacheEntry.value).filter(
+            InferenceCacheEntry.key.in_(keys)
+        ).all()
+        return {r.key: r.value for r in rows}
+    finally:
+        db.close()
+
+def store_cached_inference(cache_name: str, model_id: str, entries):
+    db = SessionLocal()
+    try:
+        for key, value in entries:
+            db.merge(InferenceCacheEntry(key=key, cache_name=cache_name, model_id=model_id, value=value))
+        db.commit()
+    except IntegrityError:
+        # Той самий ключ паралельно записав інший воркер — результат ідентичний
+        db.rollback()
+    finally:
+        db.close()
+
+def purge_inference_cache(cache_name: str, model_id: str):
+    db = SessionLocal()
+    try:
+        db.query(InferenceCacheEntry).filter(
+            InferenceCacheEntry.cache_name == cache_name,
+            InferenceCacheEntry.model_id != model_id
+        ).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+def get_tag_facets(code: str, db=None) -> dict:
+    # Кількість відгуків за кожним тегом; рахується лише по індексу feedback_tags
+    with _session(db) as db:
+        rows = (
+            db.query(FeedbackTag.tag, func.count(FeedbackTag.feedback_id).label("count"))
+            .filter(FeedbackTag.institution_code == code)
+            .group_by(FeedbackTag.tag)
+            .order_by(func.count(FeedbackTag.feedback_id).desc(), FeedbackTag.tag)
+            .all()
+        )
+        return {r.tag: r.count for r in rows}
+
+def get_feedback_counters(code: str, db=None) -> dict:
+    with _session(db) as db:
+        rows = db.query(FeedbackCounter.counter, FeedbackCounter.value).filter(
+            FeedbackCounter.institution_code == code
+        )
+        return {r.counter: r.value for r in rows}
+
+def get_feedback_stats(code: str, metric: str = "sentiment", db=None) -> dict:
+    # Читає лише рядки feedback_counters цієї інституції, без COUNT по feedbacks
+    counters = get_feedback_counters(code, db=db)
+    if metric == "spam":
+        spam_count = counters.get("spam", 0)
+        ham_count = counters.get("ham", 0)
+        return {
+            "metric": "spam",
+            "total": spam_count + ham_count,
+            "data": {"spam": spam_count, "ham": ham_count},
+        }
+    else:
+        # Лише класифіковані відгуки: pending і failed не мають мітки й не рахуються як neutral
+        total = sum(v for k, v in counters.items() if k.startswith("sentiment:"))
+        positive = counters.get("sentiment:positive", 0) + counters.get("sentiment:very positive", 0)
+        negative = counters.get("sentiment:negative", 0) + counters.get("sentiment:very negative", 0)
+        neutral = counters.get("sentiment:neutral", 0)
+        return {
+            "metric": "sentiment",
+            "total": total,
+            "data": {
+                "positive": positive,
+                "negative": negative,
+                "neutral": neutral,
+            },
+        }
+
+TIMESERIES_MAX_BUCKETS = 2000
+
+def get_feedback_timeseries(code: str, granularity: str, start: datetime, end: datetime, metric: str = "sentiment", db=None):
+    # Ряди з feedback_rollups для [start, end): діапазонний прохід по первинному ключу, без feedbacks.
+    # Повертає [(початок інтервалу, {лічильник: значення})] лише для непорожніх інтервалів
+    prefix = {"sentiment": "sentiment:", "spam": None, "lang": "lang:"}.get(metric, "sentiment:")
+    with _session(db) as db:
+        query = db.query(FeedbackRollup.bucket_start, FeedbackRollup.counter, FeedbackRollup.value).filter(
+            FeedbackRollup.institution_code == code,
+            FeedbackRollup.granularity == granularity,
+            FeedbackRollup.bucket_start >= rollup_bucket(start, granularity),
+            FeedbackRollup.bucket_start < end,
+        )
+        if prefix:
+            query = query.filter((FeedbackRollup.counter == "total") | FeedbackRollup.counter.startswith(prefix))
         else:
-            total = db.query(func.count(Feedback.id)).filter_by(
-                institution_code=code
-            ).scalar() or 0
-            positive = db.query(func.count(Feedback.id)).filter(
-                Feedback.institution_code == code,
-                func.lower(Feedback.sentiment).in_([
-                    "positive",
-                    "very positive",
-                ])
-            ).scalar() or 0
-            negative = db.query(func.count(Feedback.id)).filter(
-                Feedback.institution_code == code,
-                func.lower(Feedback.sentiment).in_([
-                    "negative",
-                    "very negative",
-                ])
-            ).scalar() or 0
-            neutral = total - positive - negative
-            return {
-                "metric": "sentiment",
-                "total": total,
-                "data": {
-                    "positive": positive,
-                    "negative": negative,
-                    "neutral": neutral,
-                },
-            }
+            query = query.filter(FeedbackRollup.counter.in_(["total", "spam", "ham"]))
+        buckets = {}
+        for r in query.order_by(FeedbackRollup.bucket_start):
+            name = r.counter[len(prefix):] if prefix and r.counter != "total" else r.counter
+            buckets.setdefault(r.bucket_start, {})[name] = r.value
+        return list(buckets.items())
+
+def rebuild_feedback_rollups(batch_size=1000) -> int:
+    # Перераховує агрегати з feedbacks з нуля (після ручних правок БД або розбіжностей); повертає к-сть відгуків
+    db = SessionLocal()
+    try:
+        totals = {}
+        seen = 0
+        query = db.query(
+            Feedback.institution_code, Feedback.created_at, Feedback.sentiment, Feedback.spam, Feedback.lang
+        ).filter(Feedback.created_at.isnot(None)).execution_options(yield_per=batch_size)
+        for r in query:
+            seen += 1
+            counters = {"total": 1, **_classification_counters(r.sentiment, r.spam)}
+            if r.lang:
+                counters[f"lang:{r.lang}"] = 1
+            for granularity in ROLLUP_GRANULARITIES:
+                bucket = rollup_bucket(r.created_at, granularity)
+                for name in counters:
+                    key = (r.institution_code, granularity, bucket, name)
+                    totals[key] = totals.get(key, 0) + 1
+        db.query(FeedbackRollup).delete(synchronize_session=False)
+        items = list(totals.items())
+        for i in range(0, len(items), batch_size):
+            db.bulk_insert_mappings(FeedbackRollup, [
+                {"institution_code": k[0], "granularity": k[1], "bucket_start": k[2], "counter": k[3], "value": v}
+                for k, v in items[i:i + batch_size]
+            ])
+        db.commit()
+        return seen
+    finally:
+        db.close()
+
+def reconcile_feedback_counters(fix=True) -> list[tuple]:
+    # Перераховує лічильники з feedbacks; повертає розбіжності (код, лічильник, було, має бути)
+    db = SessionLocal()
+    try:
+        actual = {}
+        rows = db.query(
+            Feedback.institution_code,
+            Feedback.spam,
+            func.lower(Feedback.sentiment).label("sentiment"),
+            func.count(Feedback.id).label("n"),
+        ).group_by(Feedback.institution_code, Feedback.spam, func.lower(Feedback.sentiment))
+        for r in rows:
+            counters = actual.setdefault(r.institution_code, {})
+            for name in ["total", *_classification_counters(r.sentiment, r.spam)]:
+                counters[name] = counters.get(name, 0) + r.n
+        stored = {}
+        for r in db.query(FeedbackCounter):
+            stored.setdefault(r.institution_code, {})[r.counter] = r.value
+
+        drift = []
+        for code in sorted(set(actual) | set(stored)):
+            have, want = stored.get(code, {}), actual.get(code, {})
+            for name in sorted(set(have) | set(want)):
+                if have.get(name, 0) != want.get(name, 0):
+                    drift.append((code, name, have.get(name, 0), want.get(name, 0)))
+        if fix and drift:
+            for code, name, _, value in drift:
+                db.merge(FeedbackCounter(institution_code=code, counter=name, value=value))
+            db.commit()
+        return drift
     finally:
         db.close()
@@ -0,0 +1,126 @@
+# services/dedup_service.py
+# Дешевий префільтр перед моделлю спаму: MinHash/LSH-індекс останніх відгуків кожної інституції.
+# Майже однакові тексти (той самий текст із дрібними правками, який повторює бот) знаходяться
+# за мікросекунди-мілісекунди без трансформера. Індекс наповнюється при класифікації нових
+# відгуків і перебудовується з таблиці feedbacks при старті.
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from services.db_service import load_recent_feedback_for_dedup
+
+# off — вимкнено; flag — модель працює як завжди, відгук лише отримує duplicate_of;
+# skip — для дубліката копіюється класифікація оригіналу без інференсу
+DEDUP_MODE = os.getenv("DEDUP_MODE", "flag").lower()
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+DEDUP_MAX_PER_INSTITUTION = int(os.getenv("DEDUP_MAX_PER_INSTITUTION", "5000"))
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS  # поріг LSH ≈ (1/BANDS)^(1/ROWS) ≈ 0.5
+
+_PRIME = np.uint64((1 << 31) - 1)
+_rng = np.random.RandomState(20240601)
+_A = _rng.randint(1, (1 << 31) - 1, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+_B = _rng.randint(0, (1 << 31) - 1, size=NUM_PERM, dtype=np.int64).astype(np.uint64)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def _shingles(text: str) -> set:
+    normalized = " ".join(_WORD_RE.findall(text.lower()))
+    if len(normalized) <= SHINGLE_SIZE:
+        return {normalized}
+    return {normalized[i:i + SHINGLE_SIZE] for i in range(len(normalized) - SHINGLE_SIZE + 1)}
+
+def minhash(text: str) -> np.ndarray:
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+         for s in _shingles(text)),
+        dtype=np.uint64,
+    )
+    # (a*h + b) mod p для кожної перестановки; a, h < 2^32, тож добуток вміщається в uint64
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1)
+
+class _InstitutionIndex:
+    def __init__(self):
+        self.signatures = OrderedDict()  # feedback_id -> (signature, root_id)
+        self.buckets = {}                # (band, bytes) -> set(feedback_id)
+
+    def _bands(self, signature):
+        for band in range(BANDS):
+            yield band, signature[band * ROWS:(band + 1) * ROWS].tobytes()
+
+    def query(self, signature, exclude=None):
+        candidates = set()
+        for key in self._bands(signature):
+            candidates |= self.buckets.get(key, set())
+        candidates.discard(exclude)
+        best_id, best_score = None, 0.0
+        for cid in candidates:
+            score = float((self.signatures[cid][0] == signature).mean())
+            if score > best_score:
+                best_id, best_score = cid, score
+        if best_id is not None and best_score >= DEDUP_THRESHOLD:
+            return self.signatures[best_id][1], best_score
+        return None, best_score
+
+    def add(self, feedback_id, signature, root_id):
+        self.signatures[feedback_id] = (signature, root_id)
+        for key in self._bands(signature):
+            self.buckets.setdefault(key, set()).add(feedback_id)
+        while len(self.signatures) > DEDUP_MAX_PER_INSTITUTION:
+            old_id, (old_sig, _) = self.signatures.popitem(last=False)
+            for key in self._bands(old_sig):
+                bucket = self.buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(old_id)
+                    if not bucket:
+                        del self.buckets[key]
+
+class DedupIndex:
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def check_and_add(self, institution_code: str, feedback_id: int, text: str):
+        # Повертає id оригіналу (кореня кластера), якщо текст — майже дублікат, інакше None
+        signature = minhash(text)
+        with self._lock:
+            index = self._indexes.setdefault(institution_code, _InstitutionIndex())
+            if feedback_id in index.signatures:
+                root = index.signatures[feedback_id][1]
+                return None if root == feedback_id else root
+            root, _score = index.query(signature, exclude=feedback_id)
+            index.add(feedback_id, signature, root or feedback_id)
+            return root
+
+    def rebuild(self):
+        indexes = {}
+        for feedback_id, code, text, duplicate_of in load_recent_feedback_for_dedup(DEDUP_MAX_PER_INSTITUTION):
+            index = indexes.setdefault(code, _InstitutionIndex())
+            index.add(feedback_id, minhash(text), duplicate_of or feedback_id)
+        with self._lock:
+            # Записи, додані воркером під час перебудови, теж зберігаються
+            for code, index in self._indexes.items():
+                target = indexes.setdefault(code, _InstitutionIndex())
+                for feedback_id, (signature, root) in index.signatures.items():
+                    if feedback_id not in target.signatures:
+                        target.add(feedback_id, signature, root)
+            self._indexes = indexes
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": DEDUP_MODE,
+                "threshold": DEDUP_THRESHOLD,
+                "institutions": len(self._indexes),
+                "entries": sum(len(i.signatures) for i in self._indexes.values()),
+            }
+
+dedup_index = DedupIndex()
@@ -0,0 +1,46 @@
+# services/executor_service.py
+# Окремий пул для блокуючого інференсу (torch/transformers, langdetect),
+# щоб event loop uvicorn не зупинявся на час обчислень.
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# thread — потоки (torch звільняє GIL під час обчислень);
+# process — окремі процеси для справжнього CPU-паралелізму (кожен процес завантажує свої моделі)
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread").lower()
+INFERENCE_WORKERS = max(1, int(os.getenv("INFERENCE_WORKERS", "2")))
+
+_executor = None
+_lock = threading.Lock()
+
+def get_inference_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                if INFERENCE_EXECUTOR == "process":
+                    # spawn, бо fork після ініціалізації torch може зависнути
+                    _executor = ProcessPoolExecutor(
+                        max_workers=INFERENCE_WORKERS,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    _executor = ThreadPoolExecutor(
+                        max_workers=INFERENCE_WORKERS,
+                        thread_name_prefix="inference",
+                    )
+    return _executor
+
+async def run_inference(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_inference_executor(), fn, *args)
+
+def shutdown_inference_executor():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,119 @@
+# services/export_service.py
+# Серіалізація потоку відгуків (iter_feedback_for_export) у CSV, NDJSON або Parquet.
+# Кожен формат — генератор шматків bytes: його можна віддати у StreamingResponse або записати у файл,
+# і в пам'яті одночасно лежить не більше однієї пачки рядків.
+
+import csv
+import io
+import json
+
+from services.db_service import EXPORT_FIELDS, EXPORT_SECRET_FIELDS
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+EXPORT_CHUNK_ROWS = 500
+
+def export_fields(include_secret: bool) -> list[str]:
+    return EXPORT_FIELDS + (EXPORT_SECRET_FIELDS if include_secret else [])
+
+def iter_csv(rows, include_secret: bool):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=export_fields(include_secret))
+    # BOM — щоб Excel відкрив кирилицю без ручного вибору кодування
+    buf.write("\ufeff")
+    writer.writeheader()
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode("utf-8")
+
+def iter_ndjson(rows, include_secret: bool):
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(row, ensure_ascii=False))
+        if len(chunk) >= EXPORT_CHUNK_ROWS:
+            yield ("\n".join(chunk) + "\n").encode("utf-8")
+            chunk = []
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode("utf-8")
+
+class _ChunkSink(io.RawIOBase):
+    # Файл лише для запису, з якого pyarrow пише row group'и, а ми забираємо готові байти
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def _parquet_schema(include_secret: bool):
+    import pyarrow as pa
+
+    fields = [
+        ("id", pa.int64()), ("created_at", pa.string()), ("subject", pa.string()), ("text", pa.string()),
+        ("lang", pa.string()), ("sentiment", pa.string()), ("spam", pa.bool_()), ("tags", pa.string()),
+        ("status", pa.string()), ("duplicate_of", pa.int64()), ("attachments", pa.int64()),
+    ]
+    if include_secret:
+        fields += [
+            ("secret_text", pa.string()), ("secret_sentiment", pa.string()),
+            ("secret_spam", pa.bool_()), ("secret_spam_score", pa.float64()),
+        ]
+    return pa.schema(fields)
+
+def check_parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Для експорту в Parquet потрібен пакет pyarrow (pip install pyarrow)")
+
+def iter_parquet(rows, include_secret: bool):
+    # Кожна пачка рядків — окремий row group; футер файлу дописується в кінці
+    check_parquet_available()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(include_secret)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    chunk = []
+
+    def flush():
+        writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+        chunk.clear()
+
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= EXPORT_CHUNK_ROWS:
+                flush()
+                yield sink.drain()
+        if chunk:
+            flush()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+EXPORTERS = {"csv": iter_csv, "ndjson": iter_ndjson, "parquet": iter_parquet}
+
+def iter_export(rows, fmt: str, include_secret: bool):
+    return EXPORTERS[fmt](rows, include_secret)
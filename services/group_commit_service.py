@@ -0,0 +1,131 @@
+# services/group_commit_service.py
+# Груповий коміт (DB_GROUP_COMMIT=1): записи паралельних запитів збираються в чергу,
+# і окремий потік-писач виконує їх в одній сесії одним комітом. На SQLite це один fsync
+# і одне захоплення блокування запису на пачку замість черги писачів на busy_timeout.
+# Якщо в пачці щось упало, вона відкочується і кожен запис виконується окремою транзакцією,
+# щоб помилка одного запиту не зачепила інші.
+
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+from services.db_service import SessionLocal
+
+DB_GROUP_COMMIT = os.getenv("DB_GROUP_COMMIT", "0") == "1"
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "64"))
+GROUP_COMMIT_MAX_WAIT_MS = float(os.getenv("GROUP_COMMIT_MAX_WAIT_MS", "2"))
+
+
+class GroupCommitWriter:
+    def __init__(
+        self,
+        name: str,
+        max_batch_size: int = GROUP_COMMIT_MAX_BATCH,
+        max_wait_ms: float = GROUP_COMMIT_MAX_WAIT_MS,
+    ):
+        self.name = name
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._sizes = Counter()
+        self._batches = 0
+        self._items = 0
+        self._fallbacks = 0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._loop, name=f"group-commit-{self.name}", daemon=True
+                )
+                self._thread.start()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        # fn(db, *args, **kwargs) пише через передану сесію і не комітить; результат fn — у Future
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((fn, args, kwargs, fut))
+        return fut
+
+    async def run(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Поки пишеться попередня пачка, нові записи вже накопичуються в черзі,
+            # тож під навантаженням пачки ростуть самі, а без нього чекання — лише max_wait
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get_nowait() if timeout <= 0 else self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch):
+        db = SessionLocal()
+        try:
+            results = [fn(db, *args, **kwargs) for fn, args, kwargs, _ in batch]
+            db.commit()
+        except Exception:
+            db.rollback()
+            results = None
+        finally:
+            db.close()
+        if results is None:
+            with self._lock:
+                self._fallbacks += 1
+            for item in batch:
+                self._write_one(item)
+            return
+        with self._lock:
+            self._batches += 1
+            self._items += len(batch)
+            self._sizes[len(batch)] += 1
+        for (_, _, _, fut), result in zip(batch, results):
+            fut.set_result(result)
+
+    def _write_one(self, item):
+        fn, args, kwargs, fut = item
+        db = SessionLocal()
+        try:
+            result = fn(db, *args, **kwargs)
+            db.commit()
+        except BaseException as exc:
+            fut.set_exception(exc)
+            return
+        finally:
+            db.close()
+        with self._lock:
+            self._batches += 1
+            self._items += 1
+            self._sizes[1] += 1
+        fut.set_result(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "enabled": DB_GROUP_COMMIT,
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "queue_depth": self._queue.qsize(),
+                "batches": self._batches,
+                "items": self._items,
+                "fallbacks": self._fallbacks,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "batch_sizes": dict(sorted(self._sizes.items())),
+            }
+
+
+feedback_writer = GroupCommitWriter("feedback")
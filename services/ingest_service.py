@@ -0,0 +1,226 @@
+# services/ingest_service.py
+# Масове завантаження відгуків (паперові анкети, вивантаження зі старих систем) з NDJSON або CSV.
+# Записи читаються пачками по INGEST_CHUNK_SIZE: пачка валідується, класифікується моделями
+# великими батчами в пулі інференсу і вставляється однією транзакцією (save_feedback_bulk).
+# Хід роботи повертається подіями — для потокової відповіді API і для прогресу в CLI.
+
+import asyncio
+import codecs
+import csv
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+from itertools import islice
+
+from services.classification_service import classify_texts_sorted, model_version
+from services.db_service import save_feedback_bulk, set_duplicate_of
+from services.dedup_service import dedup_index, DEDUP_MODE
+from services.executor_service import run_inference
+from services.nlp_service import detect_language
+from services.upload_service import UPLOAD_CHUNK_SIZE
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "500"))
+INGEST_MODEL_BATCH = int(os.getenv("INGEST_MODEL_BATCH", "64"))
+INGEST_MAX_BYTES = int(os.getenv("INGEST_MAX_BYTES", str(100 * 1024 * 1024)))
+INGEST_FORMATS = ("ndjson", "csv")
+
+class IngestRecordError(ValueError):
+    pass
+
+class IngestTooLarge(Exception):
+    pass
+
+def detect_format(filename: str | None, default: str = "ndjson") -> str:
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    return default
+
+async def spool_upload(upload):
+    # FastAPI закриває файли форми, щойно endpoint повертає відповідь, а події віддаються довше,
+    # тому завантаження копіюється у власний тимчасовий файл (його закриває викликач)
+    f = await asyncio.to_thread(tempfile.TemporaryFile)
+    size = 0
+    try:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > INGEST_MAX_BYTES:
+                raise IngestTooLarge(f"Файл завеликий (макс. {INGEST_MAX_BYTES // (1024 * 1024)} МБ).")
+            await asyncio.to_thread(f.write, chunk)
+        await asyncio.to_thread(f.seek, 0)
+        return f
+    except BaseException:
+        f.close()
+        raise
+
+def _decode_lines(stream, bad_lines: set):
+    # Рядок, що не є UTF-8, не зупиняє завантаження: його номер потрапляє в bad_lines,
+    # а далі йде рядок із замінними символами (його запис буде відхилено)
+    for line_no, raw in enumerate(stream, start=1):
+        if line_no == 1 and raw.startswith(codecs.BOM_UTF8):
+            raw = raw[len(codecs.BOM_UTF8):]
+        try:
+            yield raw.decode("utf-8")
+        except UnicodeDecodeError:
+            bad_lines.add(line_no)
+            yield raw.decode("utf-8", errors="replace")
+
+def iter_records(stream, fmt: str):
+    # stream — бінарний файл; повертає (номер рядка, dict) або (номер рядка, IngestRecordError)
+    bad_lines = set()
+    lines = _decode_lines(stream, bad_lines)
+    if fmt == "csv":
+        reader = csv.DictReader(lines)
+        first_line = 2
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                line_no = max(reader.line_num, first_line)
+                yield line_no, IngestRecordError(f"некоректний CSV: {e}")
+                first_line = line_no + 1
+                continue
+            # Запис CSV може займати кілька фізичних рядків (поле в лапках з переносом)
+            if any(first_line <= n <= reader.line_num for n in bad_lines):
+                yield reader.line_num, IngestRecordError("рядок не в кодуванні UTF-8")
+            else:
+                yield reader.line_num, {k.strip().lower(): v for k, v in row.items() if k}
+            first_line = reader.line_num + 1
+        return
+    for line_no, line in enumerate(lines, start=1):
+        if line_no in bad_lines:
+            yield line_no, IngestRecordError("рядок не в кодуванні UTF-8")
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, IngestRecordError(f"некоректний JSON: {e.msg}")
+            continue
+        if not isinstance(record, dict):
+            yield line_no, IngestRecordError("очікується JSON-об'єкт")
+            continue
+        yield line_no, record
+
+def _parse_created_at(value):
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(value).strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise IngestRecordError("created_at має бути датою у форматі ISO 8601")
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+def validate_record(record: dict) -> dict:
+    # Ті самі обмеження, що й у формі /submit; тема для паперових анкет необов'язкова
+    def field(name):
+        value = record.get(name)
+        return str(value).strip() if value is not None else ""
+
+    text = field("text")
+    subject = field("subject")
+    secret_text = field("secret_text")
+    tags = record.get("tags")
+    tags = ",".join(map(str, tags)) if isinstance(tags, list) else field("tags")
+    if len(text) < 3:
+        raise IngestRecordError("зміст відгуку занадто короткий")
+    if len(text) > 5000:
+        raise IngestRecordError("зміст відгуку занадто довгий (макс. 5000 символів)")
+    if len(subject) > 255:
+        raise IngestRecordError("тема відгуку занадто довга (макс. 255 символів)")
+    if len(secret_text) > 5000:
+        raise IngestRecordError("секретний зміст занадто довгий (макс. 5000 символів)")
+    if len(tags) > 255:
+        raise IngestRecordError("занадто довгий рядок тегів (макс. 255 символів)")
+    return {
+        "text": text,
+        "subject": subject or None,
+        "secret_text": secret_text or None,
+        "tags": tags,
+        "created_at": _parse_created_at(record.get("created_at")),
+    }
+
+def classify_chunk(texts: list[str], secret_texts: list[str | None]) -> list[dict]:
+    # Виконується в пулі інференсу (рівень модуля — для пулу процесів)
+    results = classify_texts_sorted(texts + [t for t in secret_texts if t], INGEST_MODEL_BATCH)
+    secret_results = iter(results[len(texts):])
+    version = model_version()
+    out = []
+    for text, main, secret_text in zip(texts, results, secret_texts):
+        secret = next(secret_results) if secret_text else None
+        out.append({
+            "lang": detect_language(text),
+            "sentiment": main["sentiment"],
+            "spam": main["spam"],
+            "secret_sentiment": secret["sentiment"] if secret else None,
+            "secret_spam": secret["spam"] if secret else 0,
+            "secret_spam_score": secret["spam_score"] if secret else 0.0,
+            "model_version": version,
+        })
+    return out
+
+async def _store_chunk(institution_code: str, items: list[dict]) -> list[int]:
+    results = await run_inference(
+        classify_chunk, [i["text"] for i in items], [i["secret_text"] for i in items]
+    )
+    for item, result in zip(items, results):
+        item.update(result)
+    ids = await asyncio.to_thread(save_feedback_bulk, institution_code, items)
+    if DEDUP_MODE != "off":
+        await asyncio.to_thread(_flag_duplicates, institution_code, ids, [i["text"] for i in items])
+    return ids
+
+def _flag_duplicates(institution_code: str, ids: list[int], texts: list[str]):
+    # Пакетне завантаження лише позначає дублікати (duplicate_of), класифікацію не пропускає
+    duplicates = []
+    for fid, text in zip(ids, texts):
+        root = dedup_index.check_and_add(institution_code, fid, text)
+        if root:
+            duplicates.append((fid, root))
+    set_duplicate_of(duplicates)
+
+async def ingest(institution_code: str, stream, fmt: str, chunk_size: int = INGEST_CHUNK_SIZE):
+    # Асинхронний генератор подій:
+    #   {"event": "error", "line": N, "error": "..."} — запис пропущено
+    #   {"event": "progress", "processed": ..., "inserted": ..., "failed": ...} — після кожної пачки
+    #   {"event": "done", ...} — підсумок
+    # Подія done надсилається завжди; якщо читання файлу обірвалося (помилка вводу-виводу),
+    # перед нею йде error з номером останнього прочитаного рядка
+    records = iter_records(stream, fmt)
+    processed = inserted = failed = 0
+    last_line = 0
+    while True:
+        try:
+            batch = await asyncio.to_thread(lambda: list(islice(records, chunk_size)))
+        except Exception as e:
+            yield {"event": "error", "line": last_line + 1, "error": f"читання файлу перервано: {e}"}
+            break
+        if not batch:
+            break
+        last_line = batch[-1][0]
+        items = []
+        for line_no, record in batch:
+            processed += 1
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                items.append(validate_record(record))
+            except IngestRecordError as e:
+                failed += 1
+                yield {"event": "error", "line": line_no, "error": str(e)}
+        if items:
+            try:
+                inserted += len(await _store_chunk(institution_code, items))
+            except Exception as e:
+                # Пачка відкочується цілком: рядки з неї вважаються невставленими
+                failed += len(items)
+                first, last = batch[0][0], batch[-1][0]
+                yield {"event": "error", "line": first, "error": f"рядки {first}-{last} не збережено: {e}"}
+        yield {"event": "progress", "processed": processed, "inserted": inserted, "failed": failed}
+    yield {"event": "done", "processed": processed, "inserted": inserted, "failed": failed}
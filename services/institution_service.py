@@ -0,0 +1,131 @@
+# services/institution_service.py
+# Реєстр інституцій у пам'яті процесу: /enter_code, /submit і адмінка шукають код у словнику,
+# а не в БД. Інституцій мало і вони лише додаються, тож реєстр перечитується тільки коли
+# змінилася версія (max(id) таблиці institutions). Невідомі коди (перебір кодів ботами)
+# звертаються до БД не частіше ніж раз на INSTITUTION_RECHECK_SECONDS — щоб побачити
+# інституцію, додану іншим воркером.
+
+import asyncio
+import csv
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+
+from services.db_service import get_all_institutions, get_institutions_version, validate_institution_code
+
+INSTITUTION_RECHECK_SECONDS = float(os.getenv("INSTITUTION_RECHECK_SECONDS", "2"))
+MAX_IMPORT_BYTES = 5 * 1024 * 1024
+MAX_IMPORT_ROWS = 50000
+MAX_NAME_LENGTH = 255
+_NAME_COLUMNS = {"official_name", "name", "назва", "офіційна назва"}
+
+InstitutionEntry = namedtuple("InstitutionEntry", "id code official_name")
+
+class InstitutionRegistry:
+    def __init__(self):
+        self._by_code = None
+        self._ordered = []
+        self._version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        with self._lock:
+            self._reload()
+
+    def _reload(self):
+        version = get_institutions_version()
+        entries = [InstitutionEntry(i.id, i.code, i.official_name) for i in get_all_institutions()]
+        self._ordered = entries
+        self._by_code = {e.code: e for e in entries}
+        # Інституція, додана між двома запитами, вже є у списку — версія враховує і її
+        self._version = max([version] + [e.id for e in entries])
+        self._checked_at = time.monotonic()
+
+    def _current(self, recheck: bool) -> dict:
+        with self._lock:
+            if self._by_code is None:
+                self._reload()
+            elif recheck and time.monotonic() - self._checked_at >= INSTITUTION_RECHECK_SECONDS:
+                self._checked_at = time.monotonic()
+                if get_institutions_version() != self._version:
+                    self._reload()
+            return self._by_code
+
+    def invalidate(self):
+        # Викликається з add_institution / add_institutions_bulk: наступне звернення цього процесу
+        # перечитає реєстр одразу, не чекаючи INSTITUTION_RECHECK_SECONDS
+        with self._lock:
+            self._by_code = None
+
+    def _needs_db(self) -> bool:
+        return self._by_code is None or time.monotonic() - self._checked_at >= INSTITUTION_RECHECK_SECONDS
+
+    def get(self, code: str):
+        # (official_name, code) або None — як get_institution_by_code
+        if not validate_institution_code(code):
+            return None
+        entry = (self._by_code or self._current(recheck=False)).get(code)
+        if entry is None:
+            entry = self._current(recheck=True).get(code)
+        return (entry.official_name, entry.code) if entry else None
+
+    async def get_async(self, code: str):
+        # Для обробників FastAPI: відомий код — зі словника, а звернення до БД (перше завантаження,
+        # перевірка версії для невідомого коду) — у потоці, щоб не блокувати event loop
+        if not validate_institution_code(code):
+            return None
+        entry = self._by_code.get(code) if self._by_code is not None else None
+        if entry is None and self._needs_db():
+            entry = (await asyncio.to_thread(self._current, True)).get(code)
+        return (entry.official_name, entry.code) if entry else None
+
+    def all(self) -> list:
+        # Для адмінки: інституції, додані іншим воркером, підхоплюються через перевірку версії,
+        # але не частіше ніж раз на INSTITUTION_RECHECK_SECONDS
+        self._current(recheck=True)
+        return self._ordered
+
+    async def all_async(self) -> list:
+        if self._needs_db():
+            await asyncio.to_thread(self._current, True)
+        return self._ordered
+
+    def stats(self) -> dict:
+        return {"institutions": len(self._ordered), "version": self._version}
+
+institution_registry = InstitutionRegistry()
+
+def parse_institutions_csv(data: bytes) -> list[str]:
+    # Назви інституцій з CSV: колонка official_name/назва, якщо є заголовок, інакше перша колонка.
+    # Excel зберігає CSV як UTF-8 з BOM або cp1251 і часто з розділювачем ';'
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        text = data.decode("cp1251")
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    rows = list(csv.reader(io.StringIO(text), dialect))
+    column, first_line = 0, 1
+    if rows:
+        header = [h.strip().lower() for h in rows[0]]
+        for i, h in enumerate(header):
+            if h in _NAME_COLUMNS:
+                column, first_line = i, 2
+                rows = rows[1:]
+                break
+    names = []
+    for line_no, row in enumerate(rows, start=first_line):
+        name = row[column].strip() if len(row) > column else ""
+        if not name:
+            continue
+        if len(name) > MAX_NAME_LENGTH:
+            raise ValueError(f"Рядок {line_no}: назва довша за {MAX_NAME_LENGTH} символів.")
+        names.append(name)
+    if len(names) > MAX_IMPORT_ROWS:
+        raise ValueError(f"Забагато інституцій в одному файлі (макс. {MAX_IMPORT_ROWS}).")
+    return names
@@ -0,0 +1,175 @@
+# services/metrics_service.py
+# Метрики у форматі Prometheus (GET /metrics): гістограми тривалості етапів обробки відгуку,
+# лічильники HTTP-запитів і показники батчерів/кешів/групового коміту. Без зовнішніх залежностей:
+# значення тримаються в пам'яті процесу (кожен воркер uvicorn віддає власні).
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Межі кошиків (секунди): від сотень мікросекунд (валідація, кеш) до секунд (моделі на CPU)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_metrics = []
+_collectors = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Для кожного набору міток: лічильники по кошиках (не кумулятивні), сума, кількість
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels[n] for n in self.labelnames)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, (le,))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def register_collector(fn):
+    # fn() -> [(name, type, help, [(labels_dict, value), ...])]; викликається при кожному зборі,
+    # тож показники, які вже рахують інші сервіси (stats()), не дублюються окремими лічильниками
+    _collectors.append(fn)
+    return fn
+
+def _render_collected(name, kind, help_text, samples) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+    return lines
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        for name, kind, help_text, samples in collector():
+            lines.extend(_render_collected(name, kind, help_text, samples))
+    return "\n".join(lines) + "\n"
+
+
+# Етапи: validation, file_write (запис у тимчасові файли), file_commit (перенесення у сховище),
+# db_insert, template_render (/submit);
+# language_detection, sentiment, spam, classification, db_update (фонова класифікація)
+stage_seconds = Histogram(
+    "feedback_stage_seconds", "Тривалість етапу обробки відгуку, с", ("stage",)
+)
+http_requests_total = Counter(
+    "http_requests_total", "Кількість HTTP-запитів", ("method", "route", "status")
+)
+http_request_seconds = Histogram(
+    "http_request_seconds", "Тривалість обробки HTTP-запиту, с", ("method", "route")
+)
+
+def stage_timer(stage: str):
+    # with stage_timer("db_insert"): ... — записує тривалість блоку в feedback_stage_seconds
+    return stage_seconds.time(stage=stage)
+
+
+class MetricsMiddleware:
+    # Чисте ASGI-проміжне ПЗ (без BaseHTTPMiddleware): потокові відповіді не буферизуються,
+    # а тривалість рахується до останнього відправленого чанка
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Шаблон маршруту (/admin/files/{attachment_id}), а не сирий шлях — інакше мітки необмежені
+            route = getattr(scope.get("route"), "path", "other")
+            method = scope["method"]
+            http_requests_total.inc(method=method, route=route, status=str(status))
+            http_request_seconds.observe(time.perf_counter() - start, method=method, route=route)
@@ -0,0 +1,130 @@
+# services/model_backend.py
+# Бекенди для класифікаторів послідовностей (сентимент, спам):
+#   torch     — звичайний PyTorch (як було раніше)
+#   quantized — динамічно квантований int8 PyTorch (nn.Linear), лише CPU
+#   onnx      — експортований ONNX-граф через onnxruntime (якщо встановлений)
+
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "quantized", "onnx")
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "onnx_cache")
+
+def model_fingerprint(path: str) -> str:
+    # Розмір і час зміни кожного файлу моделі — дешево і змінюється після перенавчання
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            full = os.path.join(root, name)
+            st = os.stat(full)
+            h.update(f"{os.path.relpath(full, path)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()[:16]
+
+class SequenceClassifier:
+    def __init__(self, name_or_path: str, backend: str = "torch", tokenizer_kwargs=None,
+                 max_length: int | None = 512, use_cuda: bool = False):
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+        self.name_or_path = name_or_path
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(name_or_path, **(tokenizer_kwargs or {}))
+        model = AutoModelForSequenceClassification.from_pretrained(name_or_path)
+        model.eval()
+        self.id2label = model.config.id2label
+        self.device = torch.device("cpu")
+        self._session = None
+
+        if backend == "onnx":
+            try:
+                self._session = self._load_onnx(model)
+            except ImportError:
+                logger.warning("onnxruntime не встановлено — %s працює на бекенді torch", name_or_path)
+                backend = "torch"
+        if backend == "quantized":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif backend == "torch" and use_cuda and torch.cuda.is_available():
+            self.device = torch.device("cuda")
+            model.to(self.device)
+        self.backend = backend
+        self.model = model if self._session is None else None
+        self.tokenizer_signature = self._tokenizer_signature()
+
+    def _tokenizer_signature(self) -> str:
+        # Дві моделі можуть ділити токенізацію, якщо їхні токенізатори дають однакові id:
+        # той самий словник, регістр і ліміт довжини (повільний і швидкий варіант вважаються однаковими)
+        tok = self.tokenizer
+        vocab = sorted(tok.get_vocab().items())
+        h = hashlib.sha256(repr(vocab).encode("utf-8"))
+        h.update(repr((
+            type(tok).__name__.removesuffix("Fast"),
+            getattr(tok, "do_lower_case", None),
+            self.max_length or tok.model_max_length,
+        )).encode())
+        return h.hexdigest()[:16]
+
+    def encode(self, texts: list[str], return_tensors: str, memo: dict | None = None):
+        if memo is None:
+            return self.tokenizer(texts, return_tensors=return_tensors, truncation=True, padding=True,
+                                  max_length=self.max_length)
+        # memo спільний для моделей одного запиту: (підпис токенізатора, текст) -> id без паддингу
+        missing = list(dict.fromkeys(t for t in texts if (self.tokenizer_signature, t) not in memo))
+        if missing:
+            enc = self.tokenizer(missing, truncation=True, max_length=self.max_length)
+            for i, t in enumerate(missing):
+                memo[(self.tokenizer_signature, t)] = {k: enc[k][i] for k in enc.keys()}
+        features = [memo[(self.tokenizer_signature, t)] for t in texts]
+        return self.tokenizer.pad(features, padding=True, return_tensors=return_tensors)
+
+    def _load_onnx(self, model):
+        import onnxruntime
+        import torch
+
+        os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+        # Для локальної моделі у назву файлу входить відбиток її файлів: після перенавчання граф експортується заново
+        source = os.path.abspath(self.name_or_path) if os.path.isdir(self.name_or_path) else self.name_or_path
+        if os.path.isdir(self.name_or_path):
+            source += model_fingerprint(self.name_or_path)
+        digest = hashlib.sha256(source.encode()).hexdigest()[:12]
+        path = os.path.join(ONNX_CACHE_DIR, f"{os.path.basename(os.path.normpath(self.name_or_path))}-{digest}.onnx")
+        if not os.path.exists(path):
+            sample = self.tokenizer(["warm up"], return_tensors="pt")
+            tmp_path = f"{path}.tmp"
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"]),
+                tmp_path,
+                input_names=["input_ids", "attention_mask"],
+                output_names=["logits"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "logits": {0: "batch"},
+                },
+                opset_version=14,
+            )
+            os.replace(tmp_path, path)
+        return onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+
+    def predict_proba(self, texts: list[str], memo: dict | None = None) -> np.ndarray:
+        # Один padded forward pass на весь батч; повертає softmax-ймовірності [batch, labels]
+        if self._session is not None:
+            enc = self.encode(texts, "np", memo)
+            feed = {i.name: enc[i.name].astype(np.int64) for i in self._session.get_inputs()}
+            logits = self._session.run(["logits"], feed)[0]
+            exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+            return exp / exp.sum(axis=-1, keepdims=True)
+
+        import torch
+        enc = self.encode(texts, "pt", memo).to(self.device)
+        with torch.no_grad():
+            logits = self.model(**enc).logits
+        return torch.nn.functional.softmax(logits, dim=-1).cpu().numpy()
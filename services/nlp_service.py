@@ -1,19 +1,65 @@
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+import os
+import threading
 from langdetect import detect
 
-model_name = "tabularisai/multilingual-sentiment-analysis"
-tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=False)
-model     = AutoModelForSequenceClassification.from_pretrained(model_name)
-sentiment_pipeline = pipeline("sentiment-analysis", model=model, tokenizer=tokenizer)
+from services.cache_service import InferenceCache
+from services.executor_service import run_inference
+from services.metrics_service import stage_timer
+
+model_name = os.getenv("SENTIMENT_MODEL", "tabularisai/multilingual-sentiment-analysis")
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "torch")  # torch | quantized | onnx
+
+# Модель завантажується ліниво (перший інференс або warm_up при старті застосунку),
+# щоб імпорт модуля не тягнув torch/transformers
+_model = None
+_load_lock = threading.Lock()
+
+# Ідентичність моделі входить у ключ кешу: зміна SENTIMENT_MODEL чи бекенду інвалідовує записи
+sentiment_cache = InferenceCache("sentiment", lambda: f"sentiment:{model_name}:{SENTIMENT_BACKEND}")
+
+def load_sentiment_model():
+    global _model
+    if _model is None:
+        with _load_lock:
+            if _model is None:
+                from services.model_backend import SequenceClassifier
+                _model = SequenceClassifier(
+                    model_name, SENTIMENT_BACKEND, tokenizer_kwargs={"use_fast": False}
+                )
+    return _model
+
+def is_sentiment_model_loaded() -> bool:
+    return _model is not None
 
 def detect_language(text: str) -> str:
     try:
-        return detect(text)
+        with stage_timer("language_detection"):
+            return detect(text)
     except:
         return "unknown"
 
+def _predict_sentiment(texts: list[str], memo: dict | None = None) -> list[str]:
+    model = load_sentiment_model()
+    # Один padded forward pass на весь батч
+    with stage_timer("sentiment"):
+        probs = model.predict_proba([t[:512] for t in texts], memo)
+    return [model.id2label[int(i)] for i in probs.argmax(axis=-1)]
+
+def analyze_sentiment_batch(texts: list[str], memo: dict | None = None) -> list[str]:
+    # memo — спільний кеш токенізації (див. classification_service.classify_texts_batch).
+    # Помилки завантаження моделі та інференсу не підміняються на "neutral": виняток доходить
+    # до воркера, який позначить відгук failed, а не збереже хибну мітку з поточною model_version
+    return sentiment_cache.run_batch(texts, lambda batch: _predict_sentiment(batch, memo))
+
 def analyze_sentiment(text: str) -> str:
-    try:
-        return sentiment_pipeline(text[:512])[0]["label"]
-    except:
-        return "neutral"
+    return analyze_sentiment_batch([text])[0]
+
+def warm_up():
+    # Завантаження моделі та пробний прохід повз кеш (ініціалізація ядер torch, профілів langdetect)
+    load_sentiment_model()
+    _predict_sentiment(["Дякую, все добре."])
+    detect_language("Дякую, все добре.")
+
+# Асинхронна точка входу: інференс виконується поза event loop
+async def detect_language_async(text: str) -> str:
+    return await run_inference(detect_language, text)
@@ -0,0 +1,89 @@
+# services/reclassify_service.py
+# Перекласифікація вже збережених відгуків після оновлення моделей (перенавчений spam_model/,
+# інший SENTIMENT_MODEL чи бекенд). Відгуки читаються пачками по id, оцінюються в кількох
+# процесах паралельно, а результати пишуться короткими транзакціями разом із checkpoint —
+# перерваний запуск продовжується з місця зупинки, а застосунок тим часом працює як завжди.
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from services.classification_service import classify_texts_sorted, model_version, warm_up_models
+from services.db_service import (
+    get_reclassify_checkpoint,
+    load_feedback_for_reclassify,
+    apply_reclassification,
+    finish_reclassify_checkpoint,
+)
+
+RECLASSIFY_WORKERS = max(1, int(os.getenv("RECLASSIFY_WORKERS", str(max(1, (os.cpu_count() or 2) // 2)))))
+RECLASSIFY_BATCH = int(os.getenv("RECLASSIFY_BATCH", "256"))
+RECLASSIFY_MODEL_BATCH = int(os.getenv("RECLASSIFY_MODEL_BATCH", "64"))
+
+def _init_worker(threads: int):
+    # Кожен процес отримує свою частку ядер, інакше потоки torch різних процесів конкурують між собою
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    warm_up_models()
+
+def score_rows(rows: list[tuple]) -> list[dict]:
+    # Виконується в процесі пулу: rows — (id, text, secret_text)
+    texts = [text for _, text, _ in rows]
+    secrets = [secret for _, _, secret in rows if secret]
+    results = classify_texts_sorted(texts + secrets, RECLASSIFY_MODEL_BATCH)
+    secret_results = iter(results[len(texts):])
+    out = []
+    for (feedback_id, _, secret_text), main in zip(rows, results):
+        secret = next(secret_results) if secret_text else None
+        out.append({
+            "id": feedback_id,
+            "sentiment": main["sentiment"],
+            "spam": main["spam"],
+            "secret_sentiment": secret["sentiment"] if secret else None,
+            "secret_spam": secret["spam"] if secret else 0,
+            "secret_spam_score": secret["spam_score"] if secret else 0.0,
+        })
+    return out
+
+def run_reclassify(workers: int = RECLASSIFY_WORKERS, batch_size: int = RECLASSIFY_BATCH,
+                   restart: bool = False, on_progress=None) -> dict:
+    # Повертає підсумковий checkpoint. on_progress(checkpoint) викликається після кожної записаної пачки
+    version = model_version()
+    checkpoint = get_reclassify_checkpoint(version, restart=restart)
+    after_id = checkpoint["last_id"]
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    # spawn, бо fork після ініціалізації torch може зависнути
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads,),
+    )
+    try:
+        # Наперед читаються й оцінюються до 2 пачок на процес, а записуються строго по порядку id,
+        # щоб checkpoint ніколи не перескочив незаписану пачку
+        in_flight = deque()
+        exhausted = False
+        while True:
+            while not exhausted and len(in_flight) < workers * 2:
+                rows = load_feedback_for_reclassify(version, after_id, batch_size)
+                if not rows:
+                    exhausted = True
+                    break
+                after_id = rows[-1][0]
+                in_flight.append((after_id, pool.submit(score_rows, rows)))
+            if not in_flight:
+                break
+            last_id, future = in_flight.popleft()
+            apply_reclassification(version, future.result(), last_id)
+            if on_progress:
+                on_progress(get_reclassify_checkpoint(version))
+    finally:
+        # При перериванні незаписані пачки відкидаються — наступний запуск почне з checkpoint
+        pool.shutdown(wait=True, cancel_futures=True)
+    finish_reclassify_checkpoint(version)
+    return get_reclassify_checkpoint(version)
@@ -0,0 +1,99 @@
+# services/search_service.py
+# Повнотекстовий пошук по темі й тексту відгуків.
+#   SQLite     — віртуальна таблиця FTS5 (external content над feedbacks), оновлюється тригерами
+#   PostgreSQL — GIN-індекс по виразу to_tsvector, оновлюється самим PostgreSQL
+# В обох випадках нові відгуки потрапляють в індекс одразу при вставці.
+
+from sqlalchemy import Float, Integer, func, inspect, literal_column, text as sql_text
+
+from services.db_service import (
+    engine, Feedback, FEEDBACK_PAGE_SIZE,
+    _session, _filter_feedback_query, _feedback_row, _load_attachments_by_feedback,
+)
+
+IS_SQLITE = engine.dialect.name == "sqlite"
+
+FTS_TABLE = "feedback_fts"
+PG_INDEX = "ix_feedbacks_fulltext"
+# Вираз має збігатися з індексом символ у символ, інакше PostgreSQL його не використає
+_PG_VECTOR = "to_tsvector('simple', coalesce(feedbacks.subject, '') || ' ' || feedbacks.text)"
+
+_SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        subject, text, content='feedbacks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedbacks_fts_ai AFTER INSERT ON feedbacks BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, subject, text) VALUES (new.id, new.subject, new.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedbacks_fts_ad AFTER DELETE ON feedbacks BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, subject, text) VALUES ('delete', old.id, old.subject, old.text);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS feedbacks_fts_au AFTER UPDATE OF subject, text ON feedbacks BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, subject, text) VALUES ('delete', old.id, old.subject, old.text);
+        INSERT INTO {FTS_TABLE}(rowid, subject, text) VALUES (new.id, new.subject, new.text);
+    END""",
+]
+
+def init_search_index():
+    # Створює індекс, якщо його ще немає; для вже заповненої БД одразу індексує старі відгуки
+    is_new = not inspect(engine).has_table(FTS_TABLE) if IS_SQLITE else False
+    with engine.begin() as conn:
+        if IS_SQLITE:
+            for ddl in _SQLITE_DDL:
+                conn.execute(sql_text(ddl))
+        else:
+            conn.execute(sql_text(f"CREATE INDEX IF NOT EXISTS {PG_INDEX} ON feedbacks USING GIN ({_PG_VECTOR})"))
+    if is_new:
+        rebuild_search_index()
+
+def rebuild_search_index():
+    with engine.begin() as conn:
+        if IS_SQLITE:
+            conn.execute(sql_text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+        else:
+            conn.execute(sql_text(f"REINDEX INDEX {PG_INDEX}"))
+
+def _fts5_query(q: str) -> str:
+    # Кожне слово — окремий літерал FTS5 з пошуком за префіксом (закінчення слів у запиті й тексті
+    # часто різні); спецсимволи синтаксису FTS5 з пошукового рядка не інтерпретуються
+    return " ".join('"' + term.replace('"', '""') + '"*' for term in q.split())
+
+def search_feedback(
+    institution_code,
+    q,
+    spam_filter='all',
+    sentiment_filter='all',
+    length_filter='all',
+    tags_filter='all',
+    tags_mode='any',
+    page=1,
+    limit=FEEDBACK_PAGE_SIZE,
+    db=None
+):
+    # Повертає (рядки, є наступна сторінка); рядки впорядковані за релевантністю
+    if not q.split():
+        return [], False
+    with _session(db) as db:
+        if IS_SQLITE:
+            # bm25: чим менше, тим релевантніше; збіг у темі важить удвічі більше
+            matches = sql_text(
+                f"SELECT rowid AS id, bm25({FTS_TABLE}, 2.0, 1.0) AS rank "
+                f"FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :q"
+            ).bindparams(q=_fts5_query(q)).columns(id=Integer, rank=Float).subquery()
+            query = db.query(Feedback).join(matches, matches.c.id == Feedback.id)
+            query = query.order_by(matches.c.rank, Feedback.id.desc())
+        else:
+            tsquery = func.websearch_to_tsquery("simple", q)
+            vector = literal_column(_PG_VECTOR)
+            query = db.query(Feedback).filter(vector.op("@@")(tsquery))
+            query = query.order_by(func.ts_rank(vector, tsquery).desc(), Feedback.id.desc())
+        query = _filter_feedback_query(
+            query, institution_code,
+            spam_filter, sentiment_filter, length_filter, tags_filter, tags_mode
+        )
+        results = query.offset((page - 1) * limit).limit(limit + 1).all()
+        has_more = len(results) > limit
+        results = results[:limit]
+        attachments = _load_attachments_by_feedback(db, [f.id for f in results])
+        return [_feedback_row(f, attachments[f.id]) for f in results], has_more
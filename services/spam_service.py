@@ -1,37 +1,88 @@
 # services/spam_service.py
 
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+import logging
 import os
+import random
+import threading
+
+from services.cache_service import InferenceCache
+from services.metrics_service import stage_timer
+from services.model_backend import SequenceClassifier, model_fingerprint
 
 # Завантаження моделі з кореня проєкту
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "spam_model")
 
-tokenizer = AutoTokenizer.from_pretrained(MODEL_PATH)
-model    = AutoModelForSequenceClassification.from_pretrained(MODEL_PATH)
+SPAM_BACKEND = os.getenv("SPAM_BACKEND", "torch")  # torch | quantized | onnx
+# Частка батчів, для яких пишеться debug-лог (лише розміри й скори, без тексту відгуків)
+SPAM_LOG_SAMPLE_RATE = float(os.getenv("SPAM_LOG_SAMPLE_RATE", "0.01"))
+
+logger = logging.getLogger(__name__)
+
+# Модель завантажується ліниво (перший інференс або warm_up при старті застосунку)
+_model = None
+_load_lock = threading.Lock()
 
-# Якщо доступний GPU
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
-model.eval()
+def load_spam_model():
+    global _model
+    if _model is None:
+        with _load_lock:
+            if _model is None:
+                # Якщо доступний GPU — бекенд torch використає його
+                _model = SequenceClassifier(MODEL_PATH, SPAM_BACKEND, max_length=None, use_cuda=True)
+    return _model
+
+def is_spam_model_loaded() -> bool:
+    return _model is not None
 
 LABELS = ["ham", "spam"]
 SPAM_THRESHOLD = 0.5  # поріг скору, можна налаштовувати
 
-def detect_spam(text: str) -> tuple[int, float]:
-    txt = text.strip()
-    if not txt:
-        print(f"[detect_spam] empty text → spam=1, ham=0")
-        return 1, 1.0
+MODEL_FINGERPRINT = model_fingerprint(MODEL_PATH)
 
-    inputs = tokenizer(txt, return_tensors="pt", truncation=True, padding=True).to(device)
+# Поріг і бекенд теж входять в ідентичність, бо від них залежить результат
+spam_cache = InferenceCache(
+    "spam",
+    lambda: f"spam:{MODEL_FINGERPRINT}:{SPAM_BACKEND}:{SPAM_THRESHOLD}",
+    decode=tuple,
+)
 
-    with torch.no_grad():
-        outputs = model(**inputs)
-        probs = torch.nn.functional.softmax(outputs.logits, dim=-1)[0].cpu().numpy()
+def _predict_spam(texts: list[str], memo: dict | None = None) -> list[tuple[int, float]]:
+    results = [None] * len(texts)
+    positions, payload = [], []
+    for i, text in enumerate(texts):
+        txt = text.strip()
+        if not txt:
+            results[i] = (1, 1.0)
+        else:
+            positions.append(i)
+            payload.append(txt)
 
-    ham_score, spam_score = float(probs[0]), float(probs[1])
-    print(f"[detect_spam] spam_score={spam_score:.3f} | ham_score={ham_score:.3f} for text={txt!r}")
+    if payload:
+        # Один padded forward pass на всі непорожні тексти батчу
+        with stage_timer("spam"):
+            probs = load_spam_model().predict_proba(payload, memo)
+
+        for i, row in zip(positions, probs):
+            spam_score = float(row[1])
+            is_spam = 1 if spam_score >= SPAM_THRESHOLD else 0
+            results[i] = (is_spam, spam_score)
+
+    if logger.isEnabledFor(logging.DEBUG) and random.random() < SPAM_LOG_SAMPLE_RATE:
+        scores = [score for _, score in results]
+        logger.debug(
+            "spam batch: size=%d empty=%d spam=%d max_score=%.3f mean_score=%.3f",
+            len(texts), len(texts) - len(payload), sum(s for s, _ in results),
+            max(scores, default=0.0), sum(scores) / len(scores) if scores else 0.0,
+        )
+    return results
+
+def detect_spam_batch(texts: list[str], memo: dict | None = None) -> list[tuple[int, float]]:
+    return spam_cache.run_batch(texts, lambda batch: _predict_spam(batch, memo))
+
+def detect_spam(text: str) -> tuple[int, float]:
+    return detect_spam_batch([text])[0]
 
-    is_spam = 1 if spam_score >= SPAM_THRESHOLD else 0
-    return is_spam, spam_score
+def warm_up():
+    # Завантаження моделі та пробний прохід повз кеш
+    load_spam_model()
+    _predict_spam(["Дякую, все добре."])
@@ -0,0 +1,154 @@
+# services/upload_service.py
+# Потокове збереження вкладень: файл читається частинами й пишеться у тимчасовий файл
+# поза event loop, ліміти на файл і на весь запит перевіряються під час читання.
+# Сховище адресується вмістом: файл лежить у ATTACHMENT_STORE_DIR/ab/cd/<sha256>,
+# однакові файли зберігаються один раз, а посилання на них рахуються через таблицю attachments.
+# Переносяться файли атомарним rename лише після успішної валідації відгуку.
+
+import asyncio
+import hashlib
+import mimetypes
+import os
+import time
+from uuid import uuid4
+
+UPLOAD_DIR = "uploads"  # старі вкладення (uploads/<uuid>/<uuid>_<name>)
+ATTACHMENT_STORE_DIR = os.getenv("ATTACHMENT_STORE_DIR", "attachment_store")
+# Поза uploads/ (його роздає StaticFiles), але на тій самій ФС, що й ATTACHMENT_STORE_DIR, —
+# щоб os.replace у сховище був атомарним
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR", "uploads_tmp")
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_FILES = 5
+MAX_UPLOAD_FILE_BYTES = int(os.getenv("MAX_UPLOAD_FILE_BYTES", str(10 * 1024 * 1024)))
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_BYTES", str(25 * 1024 * 1024)))
+STALE_TMP_SECONDS = 24 * 3600
+# Типи, які адмінка показує в браузері; решта (HTML, SVG, PDF тощо) віддається лише на завантаження
+INLINE_CONTENT_TYPES = {"image/png", "image/jpeg", "image/gif", "image/webp"}
+# Свіжі блоби GC не чіпає: між перевіркою наявності блобу і вставкою рядка attachments є вікно
+BLOB_GC_GRACE_SECONDS = 3600
+
+class UploadTooLarge(Exception):
+    pass
+
+class StagedUpload:
+    def __init__(self, filename: str, tmp_path: str, content_type: str | None):
+        self.filename = filename
+        self.tmp_path = tmp_path
+        self.content_type = content_type
+        self.size = 0
+        self.sha256 = None
+
+def _mb(n: int) -> str:
+    return f"{n / (1024 * 1024):g}"
+
+async def stage_uploads(files) -> list[StagedUpload]:
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    staged = []
+    total = 0
+    try:
+        for upload in files:
+            if not upload.filename:
+                continue
+            content_type = (
+                mimetypes.guess_type(upload.filename)[0]
+                or upload.content_type
+                or "application/octet-stream"
+            )
+            item = StagedUpload(upload.filename, os.path.join(UPLOAD_TMP_DIR, uuid4().hex), content_type)
+            staged.append(item)
+            digest = hashlib.sha256()
+            f = await asyncio.to_thread(open, item.tmp_path, "wb")
+            try:
+                while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                    item.size += len(chunk)
+                    total += len(chunk)
+                    if item.size > MAX_UPLOAD_FILE_BYTES:
+                        raise UploadTooLarge(
+                            f"Файл «{upload.filename}» завеликий (макс. {_mb(MAX_UPLOAD_FILE_BYTES)} МБ)."
+                        )
+                    if total > MAX_UPLOAD_REQUEST_BYTES:
+                        raise UploadTooLarge(
+                            f"Загальний розмір файлів завеликий (макс. {_mb(MAX_UPLOAD_REQUEST_BYTES)} МБ)."
+                        )
+                    await asyncio.to_thread(_write_chunk, f, digest, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            item.sha256 = digest.hexdigest()
+        return staged
+    except BaseException:
+        await discard_uploads(staged)
+        raise
+
+def _write_chunk(f, digest, chunk: bytes):
+    digest.update(chunk)
+    f.write(chunk)
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(ATTACHMENT_STORE_DIR, sha256[:2], sha256[2:4], sha256)
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+async def discard_uploads(staged: list[StagedUpload]):
+    for item in staged:
+        await asyncio.to_thread(_remove, item.tmp_path)
+
+def _commit(staged: list[StagedUpload]) -> list[tuple]:
+    stored = []
+    for item in staged:
+        path = blob_path(item.sha256)
+        if os.path.exists(path):
+            # Такий файл уже є — дублікат не зберігаємо, лише оновлюємо mtime для GC
+            os.remove(item.tmp_path)
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(item.tmp_path, path)
+        stored.append((os.path.basename(item.filename), path, item.sha256, item.size, item.content_type))
+    return stored
+
+async def commit_uploads(staged: list[StagedUpload]) -> list[tuple]:
+    # Повертає (filename, stored_path, sha256, size, content_type) для save_attachments.
+    # Блоби без посилань (наприклад, якщо запис у БД не вдався) прибирає gc_blobs.
+    if not staged:
+        return []
+    return await asyncio.to_thread(_commit, staged)
+
+def gc_blobs(referenced: set, dry_run: bool = False, grace_seconds: int = BLOB_GC_GRACE_SECONDS) -> tuple[int, int]:
+    # Видаляє блоби, на які не посилається жоден рядок attachments; повертає (кількість, байти)
+    removed = freed = 0
+    if not os.path.isdir(ATTACHMENT_STORE_DIR):
+        return removed, freed
+    cutoff = time.time() - grace_seconds
+    for root, _dirs, files in os.walk(ATTACHMENT_STORE_DIR):
+        for name in files:
+            if name in referenced:
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+                if st.st_mtime >= cutoff:
+                    continue
+                if not dry_run:
+                    os.remove(path)
+                removed += 1
+                freed += st.st_size
+            except OSError:
+                pass
+    return removed, freed
+
+def cleanup_stale_uploads():
+    # Тимчасові файли, що лишилися після аварійного завершення процесу
+    if not os.path.isdir(UPLOAD_TMP_DIR):
+        return
+    cutoff = time.time() - STALE_TMP_SECONDS
+    for name in os.listdir(UPLOAD_TMP_DIR):
+        path = os.path.join(UPLOAD_TMP_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Тести працюють з тимчасовою SQLite-базою: DATABASE_URL задається до імпорту services.db_service,
+# бо engine створюється при імпорті модуля
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_tmp_dir = tempfile.mkdtemp(prefix="feedback-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_tmp_dir, "feedback.db")
@@ -0,0 +1,35 @@
+import pytest
+
+from services.db_service import init_db, iter_feedback_for_export, save_feedback_bulk
+
+CODE = "export01"
+
+
+@pytest.fixture(scope="module")
+def ids():
+    init_db()
+    short, long_, both = save_feedback_bulk(CODE, [
+        {"text": "Коротко", "tags": "корупція", "sentiment": "negative", "spam": 0},
+        {"text": "Довго " * 30, "tags": "корупція", "sentiment": "negative", "spam": 0},
+        {"text": "Коротко, два теги", "tags": "корупція, неввічлива поведінка", "sentiment": "negative", "spam": 0},
+    ])
+    return {"short": short, "long": long_, "both": both}
+
+
+def _exported(**filters):
+    return {row["id"] for row in iter_feedback_for_export(CODE, **filters)}
+
+
+def test_export_respects_length_filter(ids):
+    assert _exported(length_filter="short") == {ids["short"], ids["both"]}
+    assert _exported(length_filter="long") == {ids["long"]}
+
+
+def test_export_respects_tags_mode(ids):
+    tags = "корупція, неввічлива поведінка"
+    assert _exported(tags_filter=tags, tags_mode="any") == set(ids.values())
+    assert _exported(tags_filter=tags, tags_mode="all") == {ids["both"]}
+
+
+def test_export_combines_filters(ids):
+    assert _exported(length_filter="short", tags_filter="неввічлива поведінка") == {ids["both"]}
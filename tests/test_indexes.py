@@ -0,0 +1,22 @@
+import pytest
+
+from services.db_service import expected_feedback_index, explain_feedback_filters, init_db
+
+
+@pytest.fixture(scope="module")
+def plans():
+    init_db()
+    return explain_feedback_filters()
+
+
+def test_all_filter_combinations_explained(plans):
+    # spam (all/spam/ham) × sentiment (all/negative) × length (all/short)
+    assert len(plans) == 12
+
+
+def test_filters_use_institution_index(plans):
+    for filters, index_name, plan in plans:
+        assert index_name is not None, f"{filters}: індекс не використано\n{plan}"
+        assert index_name.startswith("ix_feedbacks_institution_"), f"{filters}: {index_name}"
+        assert index_name == expected_feedback_index(filters), f"{filters}: {index_name}"
+        assert "TEMP B-TREE" not in plan.upper(), f"{filters}: сортування без індексу\n{plan}"